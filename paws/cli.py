@@ -21,12 +21,18 @@
 This module is the main entry point to paws application.
 """
 
+import json
+from socket import timeout
+from time import time
+
 import click
-from os.path import dirname, join
+from os import makedirs
+from os.path import dirname, exists, getmtime, isdir, join
 
 from paws import __file__ as paws_pathfile
-from paws.compat import ServerProxy
-from paws.constants import TASK_ARGS
+from paws.constants import POWERSHELL_BACKENDS, PYPI_JSON_URL, \
+    STATE_BACKEND_ENV, STATE_BACKENDS, TASK_ARGS, VERSION_CACHE, \
+    VERSION_CACHE_TTL, VERSION_CHECK_TIMEOUT
 from paws.core import Namespace
 from paws.helpers import file_mgmt, get_task_module_path
 from paws.main import Paws
@@ -64,45 +70,112 @@ VARS_LONG = TASK_ARGS['script_vars']['options'][1]
 SYSTEMS_SHORT = TASK_ARGS['systems']['options'][0]
 SYSTEMS_LONG = TASK_ARGS['systems']['options'][1]
 
+SERIAL_LONG = TASK_ARGS['serial']['options'][0]
 
-def get_version(ctx, param, value):
-    """Get paws version."""
-    _version = ""
-    if value and param:
+BACKEND_SHORT = TASK_ARGS['backend']['options'][0]
+BACKEND_LONG = TASK_ARGS['backend']['options'][1]
+BACKEND_DEFAULT = TASK_ARGS['backend']['default']
+
+MAX_PARALLEL_SHORT = TASK_ARGS['max_parallel']['options'][0]
+MAX_PARALLEL_LONG = TASK_ARGS['max_parallel']['options'][1]
+MAX_PARALLEL_DEFAULT = TASK_ARGS['max_parallel']['default']
+
+RESUME_LONG = TASK_ARGS['resume']['options'][0]
+
+STATE_BACKEND_LONG = TASK_ARGS['state_backend']['options'][0]
+STATE_BACKEND_DEFAULT = TASK_ARGS['state_backend']['default']
+
+
+def get_installed_version():
+    """Get the installed paws version from local data."""
+    try:
+        # Collect version from version.txt when run by cli
+        with open(join(dirname(paws_pathfile), "version.txt")) as vfile:
+            return vfile.read().strip()
+    except IOError:
+        # Collect version when run from IDE
+        with open('../Makefile') as mkfile:
+            fdata = mkfile.readlines()
+            for line in fdata:
+                if "VERSION=" in line:
+                    version = line.strip("VERSION=").strip()
+                elif "RELEASE=" in line:
+                    release = line.strip("RELEASE=").strip()
+            return version + "-" + release
+
+
+def get_released_versions(check=False):
+    """Get the latest and all released paws versions.
+
+    Results are cached on disk for VERSION_CACHE_TTL seconds. PyPI is only
+    contacted when check is set and the cache expired, the request gives up
+    after VERSION_CHECK_TIMEOUT seconds.
+
+    :param check: contact PyPI when the cache expired
+    :type check: bool
+    :return: latest and released versions, None when unknown
+    :rtype: dict
+    """
+    if exists(VERSION_CACHE) and \
+            time() - getmtime(VERSION_CACHE) < VERSION_CACHE_TTL:
         try:
-            # Collect version from version.txt when run by cli
-            _version = str(file_mgmt('r', join(dirname(
-                paws_pathfile), "version.txt"))).strip()
-        except IOError:
-            # Collect version when run from IDE
-            with open('../Makefile') as mkfile:
-                fdata = mkfile.readlines()
-                for line in fdata:
-                    if "VERSION=" in line:
-                        version = line.strip("VERSION=").strip()
-                    elif "RELEASE=" in line:
-                        release = line.strip("RELEASE=").strip()
-                _version = version + "-" + release
-        finally:
-            # get available paws versions
-            pypi = ServerProxy('https://pypi.python.org/pypi')
-            available_versions = pypi.package_releases('paws-cli')
-
-            try:
-                version_index = available_versions.index(_version)
-                if version_index == 0:
-                    status = 'an up-to-date'
-                else:
-                    status = 'an out-of-date'
-            except ValueError:
-                status = 'a pre-release'
-
-            msg = "Installed version : {0}\nLatest version    : {1}\n\n" \
-                  "You are running {2} version of paws!".\
-                format(_version, available_versions[0], status)
-
-            click.echo(msg)
-            ctx.exit()
+            with open(VERSION_CACHE) as cache:
+                return json.load(cache)
+        except (IOError, ValueError):
+            pass
+
+    if not check:
+        return None
+
+    from paws.compat import urlopen
+
+    try:
+        response = urlopen(PYPI_JSON_URL, timeout=VERSION_CHECK_TIMEOUT)
+        data = json.loads(response.read().decode('utf-8'))
+        versions = dict(latest=data['info']['version'],
+                        releases=list(data['releases']))
+    except (IOError, ValueError, KeyError, timeout):
+        return None
+
+    try:
+        if not isdir(dirname(VERSION_CACHE)):
+            makedirs(dirname(VERSION_CACHE))
+        with open(VERSION_CACHE, 'w') as cache:
+            json.dump(versions, cache)
+    except (IOError, OSError):
+        pass
+    return versions
+
+
+def get_version(ctx, param, value):
+    """Get paws version.
+
+    The installed version is shown right away. It is compared with the latest
+    released version when it is cached or when asked (--check-version).
+    """
+    if not value or not param:
+        return
+
+    _version = get_installed_version()
+    msg = "Installed version : {0}".format(_version)
+
+    versions = get_released_versions(check=param.name == 'check_version')
+    if versions is not None:
+        if _version == versions['latest']:
+            status = 'an up-to-date'
+        elif _version in versions['releases']:
+            status = 'an out-of-date'
+        else:
+            status = 'a pre-release'
+
+        msg += "\nLatest version    : {0}\n\n" \
+               "You are running {1} version of paws!".\
+            format(versions['latest'], status)
+    elif param.name == 'check_version':
+        msg += "\nLatest version    : unknown (unable to reach PyPI)"
+
+    click.echo(msg)
+    ctx.exit()
 
 
 def run(args, task):
@@ -125,17 +198,24 @@ def run(args, task):
 @click.option(USERDIR_SHORT, USERDIR_LONG, default=None,
               help="User directory", metavar="")
 @click.option("-v", "--verbose", count=True, help="Verbose mode")
+@click.option(STATE_BACKEND_LONG, default=STATE_BACKEND_DEFAULT,
+              envvar=STATE_BACKEND_ENV, type=click.Choice(STATE_BACKENDS),
+              help="Resources state backend")
 @click.option("--version", is_flag=True, callback=get_version,
               expose_value=False, is_eager=True,
               help="Show version and exit.")
+@click.option("--check-version", is_flag=True, callback=get_version,
+              expose_value=False, is_eager=True,
+              help="Compare version with the latest release and exit.")
 @click.pass_context
-def paws(ctx=None, userdir=None, verbose=None):
+def paws(ctx=None, userdir=None, verbose=None, state_backend=None):
     """PAWS - Provision Automated Windows and Services
        https://rhpit.github.io/paws
     """
     ctx.obj = dict()
     ctx.obj['userdir'] = userdir
     ctx.obj['verbose'] = verbose
+    ctx.obj['state_backend'] = state_backend
 
 
 @paws.command()
@@ -197,8 +277,13 @@ def winsetup(ctx, topology, powershell, powershell_vars, system):
 @click.option(SYSTEMS_SHORT, SYSTEMS_LONG,
               help="Systems to configure (default=all)", metavar="",
               multiple=True)
+@click.option(SERIAL_LONG, is_flag=True,
+              help="Configure one system at a time")
+@click.option(BACKEND_SHORT, BACKEND_LONG, default=BACKEND_DEFAULT,
+              type=click.Choice(POWERSHELL_BACKENDS),
+              help="PowerShell scripts backend (default=ansible)", metavar="")
 @click.pass_context
-def configure(ctx, script, topology, script_vars, system):
+def configure(ctx, script, topology, script_vars, system, serial, backend):
     """Configure Windows services"""
     if not script:
         click.echo('Please define a script to run.')
@@ -207,6 +292,8 @@ def configure(ctx, script, topology, script_vars, system):
     ctx.obj['script'] = script
     ctx.obj['topology'] = topology
     ctx.obj['script_vars'] = script_vars
+    ctx.obj['serial'] = serial
+    ctx.obj['backend'] = backend
     if len(system) > 0:
         ctx.obj['systems'] = [item for item in system]
     else:
@@ -218,14 +305,36 @@ def configure(ctx, script, topology, script_vars, system):
 @paws.command()
 @click.option(GROUP_SHORT, GROUP_LONG, required=True,
               help="Group template filename", metavar="")
+@click.option(MAX_PARALLEL_SHORT, MAX_PARALLEL_LONG,
+              default=MAX_PARALLEL_DEFAULT, type=int,
+              help="Maximum tasks run at the same time (default=%d)" %
+              MAX_PARALLEL_DEFAULT, metavar="")
+@click.option(RESUME_LONG, is_flag=True,
+              help="Skip tasks completed by the previous run")
 @click.pass_context
-def group(ctx, name):
+def group(ctx, name, max_parallel, resume):
     """Run a group template"""
     ctx.obj['name'] = name
+    ctx.obj['max_parallel'] = max_parallel
+    ctx.obj['resume'] = resume
 
     run(ctx.obj, "group")
 
 
+@paws.command()
+@click.option(CREDS_SHORT, CREDS_LONG, default=CREDS_DEFAULT,
+              help="Providers credential information", metavar="")
+@click.option(TOP_SHORT, TOP_LONG, default=TOP_DEFAULT,
+              help="System resources topology", metavar="")
+@click.pass_context
+def pool(ctx, credentials, topology):
+    """Fill the pools of ready system resources"""
+    ctx.obj['credentials'] = credentials
+    ctx.obj['topology'] = topology
+
+    run(ctx.obj, "pool")
+
+
 @paws.command()
 @click.option(CREDS_SHORT, CREDS_LONG, default=CREDS_DEFAULT,
               help="Providers credential information", metavar="")
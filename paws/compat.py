@@ -19,6 +19,7 @@
 """Compatibility module for Python 2.x/3.x support."""
 
 import sys
+from collections import namedtuple
 
 try:
     from ConfigParser import RawConfigParser
@@ -26,16 +27,94 @@ except ImportError:
     from configparser import RawConfigParser
 
 try:
-    from xmlrpclib import ServerProxy
+    from Queue import Queue
 except ImportError:
-    from xmlrpc.client import ServerProxy
+    from queue import Queue
 
 try:
     from urllib2 import urlopen
 except ImportError:
     from urllib.request import urlopen
 
+try:
+    from selectors import DefaultSelector, EVENT_WRITE
+except ImportError:
+    DefaultSelector = None
+    EVENT_WRITE = 2
+
 if sys.version_info[0] == 2:
     string_types = (str, unicode)
 else:
     string_types = (str, )
+
+
+def iter_entry_points(group):
+    """Return the entry points installed for a group.
+
+    :param group: entry points group name
+    :type group: str
+    :return: entry points, each one having a name and a load method
+    :rtype: list
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        from pkg_resources import iter_entry_points as _iter_entry_points
+        return list(_iter_entry_points(group))
+
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
+
+
+if DefaultSelector is None:
+    import select
+
+    SelectorKey = namedtuple('SelectorKey', ['fileobj', 'fd', 'events',
+                                             'data'])
+
+    class DefaultSelector(object):
+        """Minimal poll based selector for Python 2.
+
+        Only the calls paws uses are provided. poll, unlike select, is not
+        limited to file descriptors below FD_SETSIZE.
+        """
+
+        def __init__(self):
+            """Constructor."""
+            self._poll = select.poll()
+            self._keys = dict()
+
+        def register(self, fileobj, events, data=None):
+            """Watch a file object for write readiness."""
+            key = SelectorKey(fileobj, fileobj.fileno(), events, data)
+            self._poll.register(key.fd, select.POLLOUT)
+            self._keys[key.fd] = key
+            return key
+
+        def unregister(self, fileobj):
+            """Stop watching a file object."""
+            key = self._keys.pop(fileobj.fileno())
+            self._poll.unregister(key.fd)
+            return key
+
+        def select(self, timeout=None):
+            """Wait for registered file objects to be ready.
+
+            :param timeout: seconds to wait, None waits forever
+            :type timeout: float
+            :return: ready keys and events
+            :rtype: list
+            """
+            if timeout is not None:
+                timeout = max(0, int(timeout * 1000))
+            ready = list()
+            for fd, _ in self._poll.poll(timeout):
+                if fd in self._keys:
+                    ready.append((self._keys[fd], EVENT_WRITE))
+            return ready
+
+        def close(self):
+            """Forget all registered file objects."""
+            self._keys.clear()
@@ -28,6 +28,10 @@ PAWS_NAME = __paws_name__
 
 DEFAULT_USERDIR = join(expanduser('~'), 'ws')
 
+# Default number of workers used to run provider actions and group tasks
+# concurrently
+DEFAULT_MAX_WORKERS = 10
+
 # CLI definitions
 TASK_ARGS = {
     'userdir': {
@@ -68,6 +72,29 @@ TASK_ARGS = {
     'systems': {
         'dest': 'system',
         'options': ('-s', '--system')
+    },
+    'serial': {
+        'dest': 'serial',
+        'options': ('--serial',)
+    },
+    'backend': {
+        'dest': 'backend',
+        'default': 'ansible',
+        'options': ('-b', '--backend')
+    },
+    'max_parallel': {
+        'dest': 'max_parallel',
+        'default': DEFAULT_MAX_WORKERS,
+        'options': ('-mp', '--max-parallel')
+    },
+    'resume': {
+        'dest': 'resume',
+        'options': ('--resume',)
+    },
+    'state_backend': {
+        'dest': 'state_backend',
+        'default': 'file',
+        'options': ('--state-backend',)
     }
 }
 
@@ -77,7 +104,17 @@ ADMINISTRATOR = "Administrator"
 ADMINISTRADOR_PWD = "administrator_password"
 
 # Files name
-WIN_EXEC_YAML = ".powershell_exec.yaml"
+# PowerShell exec playbook, one file per variables variant (file, str, none)
+WIN_EXEC_YAML = ".powershell_exec_%s.yaml"
+
+# PowerShell scripts backends, ansible playbooks or persistent WinRM sessions
+POWERSHELL_BACKENDS = ['ansible', 'winrm']
+
+# WinRM connection settings (aligned with the ansible inventory) and the path
+# PowerShell variables files are copied to on Windows systems
+WINRM_PORT = 5986
+WINRM_TRANSPORT = 'ntlm'
+WIN_VARS_PATH = 'c:/my_vars.json'
 
 SSH_IGNORE_ERROR = [
     "time out",
@@ -87,6 +124,7 @@ SSH_IGNORE_ERROR = [
 
 # Group constants
 GROUP_SECTIONS = ["header", "vars", "tasks"]
+GROUP_CHECKPOINT = ".group_checkpoint.json"
 GROUP_SCHEMA = {'header': {}, 'vars': {}, 'tasks': []}
 # regular expressions to validate content of group yaml file
 GROUP_REQUIRED = {
@@ -104,9 +142,29 @@ OPENSTACK_ENV_VARS = [
     'OS_PASSWORD'
 ]
 
+# Openstack optional credentials settings and their default values
+OPENSTACK_OPTIONS = {
+    'max_workers': DEFAULT_MAX_WORKERS,
+    'catalog_ttl': 0,
+    'reserved_floating_ips': 0
+}
+
+# Openstack catalog listings (images, flavors, ..) cache file name
+OPENSTACK_CATALOG = '.openstack_catalog.json'
+
+# Openstack reserved floating ips file name
+OPENSTACK_FLOATING_IPS = '.openstack_floating_ips.json'
+
+# Openstack pool of ready vms file name
+OPENSTACK_POOL = '.openstack_pool.json'
+
 # Ansible constants
 ANSIBLE_INVENTORY_FILENAME = "hosts"
 
+# Attempts of an ansible play or playbook run and seconds between them
+ANSIBLE_TRIES = 3
+ANSIBLE_RETRY_DELAY = 10
+
 # Required resources keys to create vms by provision task
 PROVISION_RESOURCE_KEYS = [
     'count',
@@ -119,27 +177,53 @@ PROVISION_RESOURCE_KEYS = [
     'administrator_password'
 ]
 
+# Seconds an unused pooled ssh connection is kept open
+SSH_IDLE_TIMEOUT = 300
+
+# Seconds to wait for systems to accept ssh connections and the delay between
+# two readiness probes
+SSH_READY_TIMEOUT = 600
+SSH_PROBE_INTERVAL = 5
+
 # line divisor
 LINE = "*" * 45
 
 # Path to paws task modules
 PAWS_TASK_MODULES_PATH = "paws.tasks."
 
+# Paws version check, released versions are cached for one day
+PYPI_JSON_URL = "https://pypi.org/pypi/paws-cli/json"
+VERSION_CACHE = join(expanduser('~'), '.cache', 'paws', 'version.json')
+VERSION_CACHE_TTL = 86400
+VERSION_CHECK_TIMEOUT = 5
+
 # Documentation links
 DOC = "https://rhpit.github.io/paws"
 GROUP_HELP = "%s/create_group.html" % DOC
 LIBVIRT_AUTH_HELP = "%s/providers.html#libvirt" % DOC
 
-# Register a new supported provider to PAWS
+# Providers shipped with PAWS, aliases are other names the provider can be
+# declared with in topology and credentials files. Other providers register
+# a class under the PROVIDERS_ENTRY_POINTS entry points group.
+PROVIDERS_ENTRY_POINTS = 'paws.providers'
 PROVIDERS = [{'name': 'openstack',
               'module': 'paws.providers.openstack',
-              'class': 'OpenStack'},
+              'class': 'OpenStack',
+              'aliases': []},
              {'name': 'libvirt_kvm',
               'module': 'paws.providers.libvirt_kvm',
-              'class': 'Libvirt'}]
+              'class': 'Libvirt',
+              'aliases': ['libvirt']}]
 
 # Libvirt vm definition saved temporally to be imported during creation
 LIBVIRT_OUTPUT = '.output.xml'
 
 # Resources paws file name
 RESOURCES_PAWS = 'resources.paws'
+
+# Resources state backends, resources.paws only or a SQLite database in the
+# user directory exported to resources.paws after each provider action
+STATE_BACKENDS = ['file', 'sqlite']
+STATE_BACKEND_ENV = 'PAWS_STATE_BACKEND'
+RESOURCES_STATE_DB = '.resources.db'
+STATE_DB_TIMEOUT = 30
@@ -16,7 +16,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 """Paws core module."""
-from inspect import getmodule, stack
 from logging import DEBUG, INFO, getLogger, Formatter, StreamHandler
 from time import time
 
@@ -26,6 +25,9 @@ from paws.constants import PAWS_NAME, RESOURCES_PAWS
 
 __all__ = ['LoggerMixin', 'TimeMixin', 'PawsTask', 'Namespace']
 
+# loggers resolved per class, see LoggerMixin.logger
+_LOGGERS = dict()
+
 
 class LoggerMixin(object):
     """Create logging loggers.
@@ -72,8 +74,17 @@ class LoggerMixin(object):
 
     @property
     def logger(self):
-        """Return paws logger."""
-        return getLogger(getmodule(stack()[1][0]).__name__)
+        """Return paws logger.
+
+        The logger is named after the module defining the instance's class
+        and is resolved once per class, keeping log calls inside polling loops
+        cheap.
+        """
+        cls = self.__class__
+        try:
+            return _LOGGERS[cls]
+        except KeyError:
+            return _LOGGERS.setdefault(cls, getLogger(cls.__module__))
 
 
 class TimeMixin(object):
@@ -17,32 +17,36 @@
 #
 """Helpers module."""
 
+from atexit import register
+from contextlib import contextmanager
+from copy import deepcopy
 from functools import wraps
 from json import dump as json_dump
 from json import load as json_load
 from logging import getLogger
-from socket import error, timeout
+from socket import error, timeout, socket, SOL_SOCKET, SO_ERROR
 from subprocess import Popen
-from time import sleep
+from threading import Condition, Lock, RLock
+from time import sleep, time
 
 import warnings
-from click_spinner import spinner
-from os import remove, listdir
-from os.path import join, exists, splitext
-from paramiko import AutoAddPolicy, SSHClient
-from paramiko.ssh_exception import SSHException
-from yaml import dump as yaml_dump
-from yaml import load as yaml_load
-
-from paws.constants import LINE, PAWS_TASK_MODULES_PATH
+from os import remove, listdir, stat
+from os.path import abspath, join, exists, splitext
+
+from paws.compat import DefaultSelector, EVENT_WRITE
+from paws.constants import DEFAULT_MAX_WORKERS, LINE, PAWS_TASK_MODULES_PATH
+from paws.constants import SSH_IDLE_TIMEOUT, SSH_PROBE_INTERVAL, SSH_READY_TIMEOUT
 from paws.exceptions import SSHError
 
 LOG = getLogger(__name__)
 
 __all__ = [
-    'retry', 'cleanup', 'file_mgmt', 'update_resources_paws',
-    'log_resources', 'check_file', 'get_ssh_conn', 'exec_cmd_by_ssh',
-    'subprocess_call'
+    'retry', 'cleanup', 'file_mgmt', 'FileCache', 'FILE_CACHE',
+    'update_resources_paws',
+    'log_resources', 'check_file', 'SSHConnectionPool', 'SSH_POOL',
+    'get_ssh_conn', 'probe_ports', 'wait_for_ssh', 'exec_cmd_by_ssh',
+    'subprocess_call', 'concurrent_map', 'ANSIBLE_LOCK', 'SharedLock',
+    'RESOURCES_LOCK'
 ]
 
 
@@ -144,6 +148,16 @@ def file_mgmt(operation, file_path, content=None, cfg_parser=None):
     :return: Data that was read from a file
     :rtype: object
     """
+    from yaml import dump as yaml_dump
+    from yaml import load as yaml_load
+    try:
+        # libyaml bindings, parse and emit several times faster
+        from yaml import CSafeDumper as YamlDumper
+        from yaml import CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import SafeDumper as YamlDumper
+        from yaml import SafeLoader as YamlLoader
+
     # Determine file extension
     file_ext = splitext(file_path)[-1]
 
@@ -157,7 +171,7 @@ def file_mgmt(operation, file_path, content=None, cfg_parser=None):
             elif file_ext in ['.yaml', '.yml', '.paws']:
                 # yaml
                 with open(file_path) as f_raw:
-                    return yaml_load(f_raw)
+                    return yaml_load(f_raw, Loader=YamlLoader)
             else:
                 content = ''
                 # text
@@ -172,6 +186,7 @@ def file_mgmt(operation, file_path, content=None, cfg_parser=None):
             raise IOError("%s not found!" % file_path)
     elif operation in ['w', 'write']:
         # Write
+        FILE_CACHE.invalidate(file_path)
         mode = 'w+' if exists(file_path) else 'w'
         if file_ext == ".json":
             # json
@@ -180,7 +195,8 @@ def file_mgmt(operation, file_path, content=None, cfg_parser=None):
         elif file_ext in ['.yaml', '.yml', '.paws']:
             # yaml
             with open(file_path, mode) as f_raw:
-                yaml_dump(content, f_raw, default_flow_style=False)
+                yaml_dump(content, f_raw, Dumper=YamlDumper,
+                          default_flow_style=False)
         else:
             # text
             with open(file_path, mode) as f_raw:
@@ -193,6 +209,114 @@ def file_mgmt(operation, file_path, content=None, cfg_parser=None):
         raise Exception("Unknown file operation: %s." % operation)
 
 
+class FileCache(object):
+    """Cache of the files parsed by file_mgmt.
+
+    Files are keyed by path and only parsed again when their modification
+    time or size changes, or when file_mgmt writes them. Callers get their
+    own copy of the content, tasks are free to modify it.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._files = dict()
+        self._lock = Lock()
+
+    def read(self, file_path):
+        """Return the parsed content of a file.
+
+        :param file_path: File name including path
+        :type file_path: str
+        :return: Data that was read from the file
+        :rtype: object
+        """
+        try:
+            file_stat = stat(file_path)
+        except OSError:
+            raise IOError("%s not found!" % file_path)
+
+        key = abspath(file_path)
+        version = (file_stat.st_mtime, file_stat.st_size)
+
+        with self._lock:
+            cached = self._files.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, file_mgmt('r', file_path))
+            with self._lock:
+                self._files[key] = cached
+        return deepcopy(cached[1])
+
+    def invalidate(self, file_path):
+        """Drop a file from the cache.
+
+        :param file_path: File name including path
+        :type file_path: str
+        """
+        with self._lock:
+            self._files.pop(abspath(file_path), None)
+
+
+# parsed files shared by paws and group runs
+FILE_CACHE = FileCache()
+
+# ansible runs (and group tasks driving ansible) one at a time, the ansible
+# api and the files it reads in the user directory are not thread safe
+ANSIBLE_LOCK = RLock()
+
+
+class SharedLock(object):
+    """Lock held either by many readers or by a single writer.
+
+    Writers waiting for the lock go first, readers arriving after a writer
+    wait for it.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._cond = Condition(Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        """Hold the lock along with other readers."""
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the lock alone."""
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+# group tasks reading resources.paws and the inventory share this lock,
+# provider actions rewriting them hold it alone
+RESOURCES_LOCK = SharedLock()
+
+
 def update_resources_paws(resources_paws_path, resources_paws_content):
     """
     re-write resource.paws with content of object passed as parameter.
@@ -274,12 +398,177 @@ def check_file(file_path, error_msg=None):
             raise IOError("%s file not found!" % file_path)
 
 
+class SSHConnectionPool(object):
+    """Pool of open ssh connections.
+
+    Connections are keyed by host, username and authentication. A connection
+    is reused by every helper talking to the same system, so each system only
+    goes through one ssh key exchange per run. Connections found dead are
+    replaced and connections unused for longer than the idle timeout are
+    closed.
+    """
+
+    def __init__(self, idle_timeout=SSH_IDLE_TIMEOUT):
+        """Constructor.
+
+        :param idle_timeout: seconds an unused connection is kept open
+        :type idle_timeout: int
+        """
+        self.idle_timeout = idle_timeout
+        self._connections = dict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(host, username, password=None, ssh_key=None):
+        """Return the pool key for a connection.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        :param ssh_key: SSH private key for authentication
+        :type ssh_key: str
+        :return: pool key
+        :rtype: tuple
+        """
+        return host, username, password, ssh_key
+
+    @staticmethod
+    def is_alive(ssh):
+        """Check if a connection is still usable.
+
+        :param ssh: ssh client
+        :type ssh: SSHClient
+        :return: whether the connection is alive
+        :rtype: bool
+        """
+        transport = ssh.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def evict(self):
+        """Close the connections unused for longer than the idle timeout."""
+        now = time()
+        with self._lock:
+            idle = [key for key, (ssh, used) in self._connections.items()
+                    if now - used > self.idle_timeout]
+            closing = [self._connections.pop(key)[0] for key in idle]
+        for ssh in closing:
+            ssh.close()
+
+    def get(self, host, username, password=None, ssh_key=None, timeout=5):
+        """Return an open connection, connecting when none is pooled.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        :param ssh_key: SSH private key for authentication
+        :type ssh_key: str
+        :param timeout: connect timeout in seconds
+        :type timeout: int
+        :return: ssh client
+        :rtype: SSHClient
+        """
+        from paramiko import AutoAddPolicy, SSHClient
+
+        self.evict()
+        key = self.key(host, username, password, ssh_key)
+
+        # connections are checked in place, other threads may be using them
+        with self._lock:
+            pooled = self._connections.get(key)
+            if pooled and self.is_alive(pooled[0]):
+                self._connections[key] = (pooled[0], time())
+                return pooled[0]
+
+        ssh = SSHClient()
+        ssh.load_system_host_keys()
+        ssh.set_missing_host_key_policy(AutoAddPolicy())
+        ssh.connect(hostname=host,
+                    username=username,
+                    password=password,
+                    key_filename=ssh_key,
+                    timeout=timeout)
+        return self.put(key, ssh)
+
+    def put(self, key, ssh):
+        """Add a connection to the pool.
+
+        A live connection already pooled, e.g. opened by another thread in
+        the meantime, is kept and the new connection closed. A dead one is
+        replaced.
+
+        :param key: pool key
+        :type key: tuple
+        :param ssh: ssh client
+        :type ssh: SSHClient
+        :return: the pooled ssh client
+        :rtype: SSHClient
+        """
+        with self._lock:
+            pooled = self._connections.get(key)
+            if pooled and pooled[0] is not ssh and self.is_alive(pooled[0]):
+                closing, ssh = ssh, pooled[0]
+            else:
+                closing = pooled[0] if pooled and pooled[0] is not ssh \
+                    else None
+            self._connections[key] = (ssh, time())
+        if closing is not None:
+            closing.close()
+        return ssh
+
+    def discard(self, host, username, password=None, ssh_key=None):
+        """Close and remove a connection from the pool.
+
+        Used when a connection is known to be going away, e.g. the remote
+        system is rebooting or releasing its ip addresses.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        :param ssh_key: SSH private key for authentication
+        :type ssh_key: str
+        """
+        with self._lock:
+            pooled = self._connections.pop(
+                self.key(host, username, password, ssh_key), None)
+        if pooled:
+            pooled[0].close()
+
+    def close(self):
+        """Close all pooled connections."""
+        with self._lock:
+            closing = [ssh for ssh, used in self._connections.values()]
+            self._connections.clear()
+        for ssh in closing:
+            ssh.close()
+
+
+# ssh connections shared by the helpers below, closed at exit
+SSH_POOL = SSHConnectionPool()
+register(SSH_POOL.close)
+
+
 @ignore_warnings
 @retry(SSHError, tries=60)
 def get_ssh_conn(host, username, password=None, ssh_key=None):
     """Connect to a remote system by SSH port 22.
 
     By default it will retry 60 times until it establishes an ssh connection.
+    The connection is kept in the ssh pool for later commands.
 
     :param host: Remote systems IP address
     :type host: str
@@ -290,27 +579,133 @@ def get_ssh_conn(host, username, password=None, ssh_key=None):
     :param ssh_key: SSH private key for authentication
     :type ssh_key: str
     """
+    from click_spinner import spinner
+    from paramiko.ssh_exception import SSHException
+
     with spinner():
         try:
-            ssh = SSHClient()
-            ssh.load_system_host_keys()
-            ssh.set_missing_host_key_policy(AutoAddPolicy())
-            if ssh_key:
-                ssh.connect(hostname=host,
-                            username=username,
-                            key_filename=ssh_key,
-                            timeout=5)
-            if password:
-                ssh.connect(hostname=host,
-                            username=username,
-                            password=password,
-                            timeout=5)
-            ssh.close()
+            SSH_POOL.get(host, username, password, ssh_key, timeout=5)
             LOG.info("Successfully established SSH connection to %s", host)
         except (error, SSHException, timeout):
+            SSH_POOL.discard(host, username, password, ssh_key)
             raise SSHError('Port 22 is unreachable.')
 
 
+def probe_ports(hosts, port=22, timeout=SSH_PROBE_INTERVAL):
+    """Check which hosts accept tcp connections on a port.
+
+    All hosts are probed at the same time using non-blocking sockets.
+
+    :param hosts: Remote systems IP addresses
+    :type hosts: list
+    :param port: Port to probe
+    :type port: int
+    :param timeout: Seconds to wait for the connections
+    :type timeout: float
+    :return: hosts accepting connections
+    :rtype: set
+    """
+    pending = dict()
+    opened = set()
+
+    for host in set(hosts):
+        sock = socket()
+        sock.setblocking(0)
+        try:
+            sock.connect_ex((host, port))
+        except error:
+            sock.close()
+            continue
+        pending[sock] = host
+
+    # selectors are not limited to file descriptors below FD_SETSIZE
+    selector = DefaultSelector()
+    for sock in pending:
+        selector.register(sock, EVENT_WRITE)
+
+    end = time() + timeout
+    try:
+        while pending:
+            remaining = max(0, end - time())
+            for key, _ in selector.select(remaining):
+                sock = key.fileobj
+                if sock.getsockopt(SOL_SOCKET, SO_ERROR) == 0:
+                    opened.add(pending[sock])
+                selector.unregister(sock)
+                sock.close()
+                del pending[sock]
+            if not remaining:
+                break
+    finally:
+        selector.close()
+        for sock in pending:
+            sock.close()
+
+    return opened
+
+
+@ignore_warnings
+def wait_for_ssh(systems, timeout=SSH_READY_TIMEOUT,
+                 interval=SSH_PROBE_INTERVAL, max_workers=DEFAULT_MAX_WORKERS):
+    """Wait for remote systems to accept SSH connections.
+
+    All systems are probed at the same time. A cheap tcp check of port 22 is
+    done first, the SSH handshake is only attempted once the port is open.
+    Established connections are kept in the ssh pool. It returns as soon as
+    every system is ready or the timeout expires.
+
+    :param systems: Systems with host, username, password and ssh_key keys
+        (password and ssh_key are optional)
+    :type systems: list
+    :param timeout: Seconds to wait for all systems
+    :type timeout: int
+    :param interval: Seconds between two probes of a system
+    :type interval: int
+    :param max_workers: Maximum number of SSH handshakes at the same time
+    :type max_workers: int
+    :return: whether each host is ready, by host
+    :rtype: dict
+    """
+    from click_spinner import spinner
+
+    def connect(system):
+        SSH_POOL.get(system['host'], system['username'],
+                     system.get('password'), system.get('ssh_key'),
+                     timeout=interval)
+
+    ready = dict((system['host'], False) for system in systems)
+    pending = list(systems)
+    end = time() + timeout
+
+    with spinner():
+        while pending:
+            started = time()
+            opened = probe_ports(
+                [system['host'] for system in pending],
+                timeout=max(0, min(interval, end - started))
+            )
+
+            candidates = [system for system in pending
+                          if system['host'] in opened]
+            results = concurrent_map(connect, candidates, max_workers)
+            for system, (result, ex) in zip(candidates, results):
+                if ex is None:
+                    ready[system['host']] = True
+                    LOG.info("Successfully established SSH connection to "
+                             "%s", system['host'])
+                else:
+                    LOG.debug("SSH connection to %s failed: %s",
+                              system['host'], ex)
+
+            pending = [system for system in pending
+                       if not ready[system['host']]]
+            if not pending or time() >= end:
+                break
+            sleep(max(0, min(interval - (time() - started), end - time())))
+
+    return ready
+
+
 @ignore_warnings
 @retry(SSHError, tries=60)
 def exec_cmd_by_ssh(host, username, cmd, password=None, ssh_key=None,
@@ -318,6 +713,8 @@ def exec_cmd_by_ssh(host, username, cmd, password=None, ssh_key=None,
     """Connect to a remote system by SSH port 22 and run a command.
 
     By default it will retry 60 times until it establishes an ssh connection.
+    The connection is taken from the ssh pool, fire and forget commands
+    remove it from the pool once sent.
 
     :param host: Remote systems IP address
     :type host: str
@@ -332,21 +729,12 @@ def exec_cmd_by_ssh(host, username, cmd, password=None, ssh_key=None,
     :param fire_forget: fire and forget the command
     :type fire_forget: bool
     """
+    from click_spinner import spinner
+    from paramiko.ssh_exception import SSHException
+
     with spinner():
         try:
-            ssh = SSHClient()
-            ssh.load_system_host_keys()
-            ssh.set_missing_host_key_policy(AutoAddPolicy())
-            if ssh_key:
-                ssh.connect(hostname=host,
-                            username=username,
-                            key_filename=ssh_key,
-                            timeout=30)
-            if password:
-                ssh.connect(hostname=host,
-                            username=username,
-                            password=password,
-                            timeout=30)
+            ssh = SSH_POOL.get(host, username, password, ssh_key, timeout=30)
 
             if fire_forget:
                 # fire and forget the command given, will return no output
@@ -354,6 +742,7 @@ def exec_cmd_by_ssh(host, username, cmd, password=None, ssh_key=None,
                 channel = ssh.get_transport().open_session(timeout=_timeout)
                 channel.settimeout(_timeout)
                 channel.exec_command(cmd)
+                SSH_POOL.discard(host, username, password, ssh_key)
                 LOG.info('Successfully executed command: %s' % cmd)
             else:
                 results = ssh.exec_command(cmd)
@@ -361,13 +750,12 @@ def exec_cmd_by_ssh(host, username, cmd, password=None, ssh_key=None,
                 if return_code:
                     LOG.error('Command %s failed to execute.' % cmd)
                     LOG.error(results[2].read())
-                    ssh.close()
                     raise SystemExit(return_code)
                 else:
                     LOG.debug(results[1].read().strip())
                     LOG.info("Successfully executed command: %s", cmd)
-                    ssh.close()
         except (error, SSHException, timeout):
+            SSH_POOL.discard(host, username, password, ssh_key)
             raise SSHError('Port 22 is unreachable.')
 
 
@@ -410,6 +798,41 @@ def subprocess_call(cmd, fatal=True, cwd=None, stdout=None, stderr=None,
     return results
 
 
+def concurrent_map(function, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Call a function for each item using a bounded pool of threads.
+
+    Failures are isolated per item, an exception raised while processing one
+    item does not stop the remaining items from being processed.
+
+    :param function: Function to call with each item
+    :type function: function
+    :param items: Items to process
+    :type items: list
+    :param max_workers: Maximum number of items processed at the same time
+    :type max_workers: int
+    :return: (result, exception) tuple for each item, in the items order
+    :rtype: list
+    """
+    from multiprocessing.pool import ThreadPool
+
+    def call(item):
+        try:
+            return function(item), None
+        except (Exception, SystemExit) as ex:
+            return None, ex
+
+    items = list(items)
+    if not items:
+        return []
+
+    pool = ThreadPool(max(1, min(int(max_workers), len(items))))
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def get_task_module_path(name):
     """Return the task module path.
 
@@ -419,6 +842,6 @@ def get_task_module_path(name):
     :rtype: str
     """
     _path = PAWS_TASK_MODULES_PATH + name
-    if name in ['provision', 'teardown', 'show']:
+    if name in ['provision', 'teardown', 'show', 'pool']:
         _path = PAWS_TASK_MODULES_PATH + 'action'
     return _path
@@ -0,0 +1,157 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Module containing functions regarding the ansible inventory file.
+
+This module does not depend on ansible, providers can create the inventory
+file without paying for importing ansible.
+"""
+
+from hashlib import sha1
+from json import dumps
+from logging import getLogger
+from tempfile import mkstemp
+
+import os
+
+from paws.compat import RawConfigParser
+from paws.helpers import file_mgmt
+
+LOG = getLogger(__name__)
+
+__all__ = ['inventory_init', 'inventory_digest', 'inventory_reuse',
+           'create_inventory']
+
+# first line of generated inventory files, followed by the resources digest
+DIGEST_HEADER = '# paws inventory digest: '
+
+
+def inventory_init(filename):
+    """Initialize a inventory file.
+
+    This will just touch an empty inventory file in the user directory. It is
+    primarily called to ignore ansible warning messages when running commands
+    on the local host.
+
+    :param filename: inventory file
+    """
+    file_mgmt('w', filename, '')
+
+
+def inventory_digest(resources):
+    """Return the digest of the resource fields written to the inventory.
+
+    :param resources: windows resources
+    :return: digest
+    :rtype: str
+    """
+    fields = list()
+    try:
+        for res in resources['resources']:
+            fields.append([
+                res['name'].replace(" ", ""),
+                str(res['public_v4'] if 'public_v4' in res else res['ip']),
+                res['win_username'],
+                res['win_password']
+            ])
+    except KeyError as ex:
+        LOG.error('Required resource key %s missing!', ex)
+        raise SystemExit(1)
+    return sha1(dumps(fields).encode('utf-8')).hexdigest()
+
+
+def read_digest(filename):
+    """Return the resources digest stored in an inventory file header.
+
+    :param filename: inventory file
+    :return: digest or None when the file has no digest
+    :rtype: str
+    """
+    try:
+        with open(filename) as f_raw:
+            line = f_raw.readline().strip()
+    except IOError:
+        return None
+    if line.startswith(DIGEST_HEADER):
+        return line[len(DIGEST_HEADER):]
+    return None
+
+
+def inventory_reuse(filename, resources):
+    """Determine if we can re-use an existing inventory file.
+
+    The inventory can be reused when the digest stored in its header matches
+    the digest of the resources given.
+
+    :param filename: inventory file
+    :param resources: windows resources
+    """
+    if read_digest(filename) == inventory_digest(resources):
+        LOG.debug('Reusing inventory file.')
+        return True
+    return False
+
+
+def create_inventory(filename, resources=None):
+    """Create a inventory file.
+
+    The inventory is built in memory and written once, to a temporary file
+    renamed over the inventory file, so readers never see a partial file. Its
+    first line holds the digest of the resources, an inventory created for
+    the same resources is left untouched.
+
+    :param filename: inventory file
+    :param resources: windows resources
+    """
+
+    # can we reuse a existing inventory file?
+    digest = inventory_digest(resources)
+    if read_digest(filename) == digest:
+        LOG.debug('Reusing inventory file.')
+        return
+
+    # hosts are written as keys without values
+    config = RawConfigParser(allow_no_value=True)
+
+    for item in resources['resources']:
+        section = item['name'].replace(" ", "")
+        config.add_section(section)
+
+        try:
+            config.set(section, str(item['public_v4']))
+        except KeyError:
+            config.set(section, item['ip'])
+
+        section = section + ":vars"
+        config.add_section(section)
+        config.set(section, "ansible_user", item['win_username'])
+        config.set(section, "ansible_password", item['win_password'])
+        config.set(section, "ansible_port", "5986")
+        config.set(section, "ansible_connection", "winrm")
+        config.set(section, "ansible_winrm_server_cert_validation",
+                   "ignore")
+
+    # unique temporary file, providers may create inventories concurrently
+    handle, tmp_filename = mkstemp(dir=os.path.dirname(filename) or '.',
+                                   prefix='.inventory')
+    with os.fdopen(handle, 'w') as f_raw:
+        f_raw.write(DIGEST_HEADER + digest + '\n')
+        config.write(f_raw)
+    os.rename(tmp_filename, filename)
+
+    LOG.debug("Inventory file %s created.", filename)
@@ -0,0 +1,292 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Module containing classes and functions to run Windows PowerShell scripts
+over persistent WinRM sessions.
+
+Sessions are opened once per system and kept open for the whole process, so
+running several scripts against a system (e.g. within a group run) only pays
+the WinRM connection and authentication cost once.
+"""
+
+from atexit import register
+from base64 import b64encode
+from hashlib import sha1
+from logging import getLogger
+from threading import Lock
+
+from paws.constants import DEFAULT_MAX_WORKERS, WINRM_PORT, WINRM_TRANSPORT
+from paws.helpers import concurrent_map
+
+LOG = getLogger(__name__)
+
+__all__ = ['WinRMSession', 'WinRMSessionPool', 'WINRM_POOL', 'run_powershell']
+
+# base64 characters sent per command when uploading a file, keeps the encoded
+# command under the windows command line length limit
+UPLOAD_CHUNK_SIZE = 2000
+
+
+class WinRMSession(object):
+    """WinRM session to a Windows system.
+
+    A remote shell is opened once and every command runs within it. Commands
+    sent to the same session are serialized.
+    """
+
+    def __init__(self, host, username, password):
+        """Constructor.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        """
+        from winrm.protocol import Protocol
+
+        self.host = host
+        self.lock = Lock()
+        self.uploaded = dict()
+        self.protocol = Protocol(
+            endpoint='https://%s:%d/wsman' % (host, WINRM_PORT),
+            transport=WINRM_TRANSPORT,
+            username=username,
+            password=password,
+            server_cert_validation='ignore'
+        )
+        self.shell_id = self.protocol.open_shell()
+        LOG.debug('WinRM session opened to %s.', host)
+
+    def run_ps(self, script):
+        """Run a PowerShell script block.
+
+        :param script: PowerShell code
+        :type script: str
+        :return: return code, standard output and standard error
+        :rtype: tuple
+        """
+        encoded = b64encode(script.encode('utf_16_le')).decode('ascii')
+        command_id = self.protocol.run_command(
+            self.shell_id, 'powershell',
+            ['-NoProfile', '-NonInteractive', '-EncodedCommand', encoded])
+        try:
+            stdout, stderr, return_code = self.protocol.get_command_output(
+                self.shell_id, command_id)
+        finally:
+            self.protocol.cleanup_command(self.shell_id, command_id)
+        return (return_code, stdout.decode('utf-8', 'replace'),
+                stderr.decode('utf-8', 'replace'))
+
+    def upload(self, content, path):
+        """Write content to a file on the Windows system.
+
+        Content already uploaded to the same path by this session is not sent
+        again.
+
+        :param content: File content
+        :type content: bytes
+        :param path: Remote file path
+        :type path: str
+        """
+        digest = sha1(content).hexdigest()
+        if self.uploaded.get(path) == digest:
+            return
+
+        data = b64encode(content).decode('ascii')
+        staging = '%s.b64' % path
+        self.run_checked("Set-Content -Path '%s' -Value '' -NoNewline" %
+                         staging)
+        for index in range(0, len(data), UPLOAD_CHUNK_SIZE):
+            self.run_checked(
+                "Add-Content -Path '%s' -Value '%s' -NoNewline" %
+                (staging, data[index:index + UPLOAD_CHUNK_SIZE]))
+        self.run_checked(
+            "[IO.File]::WriteAllBytes('%s', [Convert]::FromBase64String("
+            "(Get-Content -Path '%s' -Raw))); Remove-Item -Path '%s'" %
+            (path, staging, staging))
+
+        self.uploaded[path] = digest
+
+    def run_checked(self, script):
+        """Run a PowerShell script block which must succeed.
+
+        :param script: PowerShell code
+        :type script: str
+        """
+        return_code, stdout, stderr = self.run_ps(script)
+        if return_code:
+            raise RuntimeError('Command failed on %s: %s' %
+                               (self.host, stderr))
+
+    def close(self):
+        """Close the remote shell."""
+        try:
+            self.protocol.close_shell(self.shell_id)
+        except Exception as ex:
+            LOG.debug('Unable to close WinRM session to %s: %s',
+                      self.host, ex)
+
+
+class WinRMSessionPool(object):
+    """Pool of open WinRM sessions keyed by host and credentials."""
+
+    def __init__(self):
+        """Constructor."""
+        self._sessions = dict()
+        self._lock = Lock()
+
+    def get(self, host, username, password):
+        """Return the session to a system, opening it when none is pooled.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        :return: WinRM session
+        :rtype: WinRMSession
+        """
+        key = (host, username, password)
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        session = WinRMSession(host, username, password)
+        with self._lock:
+            pooled = self._sessions.setdefault(key, session)
+        if pooled is not session:
+            session.close()
+        return pooled
+
+    def discard(self, host, username, password):
+        """Close and remove a session from the pool.
+
+        :param host: Remote systems IP address
+        :type host: str
+        :param username: Username
+        :type username: str
+        :param password: Password
+        :type password: str
+        """
+        with self._lock:
+            session = self._sessions.pop((host, username, password), None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        """Close all pooled sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# WinRM sessions shared by all PowerShell runs, closed at exit
+WINRM_POOL = WinRMSessionPool()
+register(WINRM_POOL.close)
+
+
+def run_powershell(systems, script, script_vars=None, vars_type=None,
+                   max_workers=DEFAULT_MAX_WORKERS):
+    """Run a PowerShell script on Windows systems over pooled WinRM sessions.
+
+    The script runs on all systems at the same time. Its results are shaped
+    like the ansible callback results, one item per system, so they can be
+    processed by the ansible results handlers.
+
+    :param systems: Systems with host, username and password keys
+    :type systems: list
+    :param script: PowerShell script file
+    :type script: str
+    :param script_vars: PowerShell variables file or string
+    :type script_vars: str
+    :param vars_type: Variables type, file, str or None
+    :type vars_type: str
+    :param max_workers: Maximum number of systems processed at the same time
+    :type max_workers: int
+    :return: results for each system
+    :rtype: list
+    """
+    with open(script, 'rb') as f_raw:
+        content = f_raw.read()
+    remote_script = 'c:/windows/temp/paws_%s.ps1' % sha1(content).hexdigest()
+
+    arguments = ''
+    variables = None
+    if vars_type == 'file':
+        with open(script_vars, 'rb') as f_raw:
+            variables = f_raw.read()
+        # named after its content, scripts running at the same time on a
+        # system with other variables never read each other files
+        arguments = 'c:/windows/temp/paws_vars_%s.json' % \
+            sha1(variables).hexdigest()
+    elif vars_type == 'str':
+        arguments = script_vars
+
+    def prepare(session):
+        if variables is not None:
+            session.upload(variables, arguments)
+        session.upload(content, remote_script)
+
+    def run(system):
+        credentials = (system['host'], system['username'], system['password'])
+        try:
+            session = WINRM_POOL.get(*credentials)
+            with session.lock:
+                prepare(session)
+        except RuntimeError:
+            raise
+        except Exception as ex:
+            # the pooled session may have expired, retry with a new one. The
+            # script did not start yet, it is safe to do it again.
+            LOG.debug('WinRM session to %s failed: %s', system['host'], ex)
+            WINRM_POOL.discard(*credentials)
+            session = WINRM_POOL.get(*credentials)
+            with session.lock:
+                prepare(session)
+
+        # the script is never run again, failures are reported as results
+        with session.lock:
+            try:
+                return session.run_ps(
+                    "$ErrorActionPreference = 'Stop'\n& '%s' %s\n"
+                    "exit $LASTEXITCODE" % (remote_script, arguments))
+            except Exception:
+                WINRM_POOL.discard(*credentials)
+                raise
+
+    results = list()
+    for system, (result, ex) in zip(
+            systems, concurrent_map(run, systems, max_workers)):
+        if ex is not None:
+            results.append(dict(host=system['host'], success=False,
+                                results=dict(msg=str(ex))))
+            continue
+
+        return_code, stdout, stderr = result
+        item = dict(rc=return_code, stdout=stdout, stderr=stderr)
+        if return_code:
+            item['msg'] = 'non-zero return code'
+        results.append(dict(host=system['host'], success=not return_code,
+                            results=item))
+    return results
@@ -18,13 +18,14 @@
 
 """Module containing classes and functions regarding remote connections."""
 
-import sys
+from hashlib import sha1
 from logging import getLogger
 from pprint import pformat
 
 import os
 from click_spinner import spinner
 from collections import namedtuple
+from threading import Lock
 
 try:
     # < 2.4
@@ -42,109 +43,123 @@ from ansible.parsing.dataloader import DataLoader
 from ansible.playbook.play import Play
 from ansible.plugins.callback import CallbackBase
 
-from paws.compat import RawConfigParser
 from paws.constants import ANSIBLE_INVENTORY_FILENAME as ANSIBLE_INVENTORY
-from paws.helpers import retry
-from paws.helpers import file_mgmt
+from paws.constants import ANSIBLE_RETRY_DELAY, ANSIBLE_TRIES
+from paws.helpers import ANSIBLE_LOCK, retry
+from paws.lib.inventory import inventory_init, inventory_reuse, \
+    create_inventory
 
 LOG = getLogger(__name__)
 
 __all__ = ['inventory_init', 'inventory_reuse', 'create_inventory',
-           'PawsCallback', 'ResultsHandler', 'PlayCall', 'PlaybookCall',
+           'AnsibleContext', 'PawsCallback', 'ResultsHandler', 'PlayCall',
+           'PlaybookCall',
            'GenModuleResults', 'ParsePSResults']
 
 
-def inventory_init(filename):
-    """Initialize a inventory file.
+class AnsibleContext(object):
+    """Ansible inventory shared by the play and playbook calls.
 
-    This will just touch an empty inventory file in the user directory. It is
-    primarily called to ignore ansible warning messages when running commands
-    on the local host.
-
-    :param filename: inventory file
+    The inventory is parsed once per inventory file and shared by every call
+    made in the same process (configure, winsetup and group runs). It is only
+    parsed again when the inventory file content changes. Each call gets its
+    own data loader and variable manager, facts and cached files of a call
+    never leak into the next one.
     """
-    file_mgmt('w', filename, '')
 
+    _contexts = dict()
+    _lock = Lock()
 
-def inventory_reuse(filename, resources):
-    """Determine if we can re-use an existing inventory file.
+    def __init__(self, inventory_file):
+        """Constructor.
 
-    This will check if the resources given exist within the existing inventory
-    file. If they are we can reuse the file!
+        :param inventory_file: ansible inventory file
+        :type inventory_file: str
+        """
+        self.inventory_file = inventory_file
+        self.inventory = None
+        self.stat = None
+        self.digest = None
 
-    :param filename: inventory file
-    :param resources: windows resources
-    """
-    if not os.path.exists(filename):
-        # inventory not found
-        return False
-
-    try:
-        # load existing inventory
-        data = file_mgmt('r', filename)
-
-        count = 0
-
-        # do the active resources exist within the inventory?
-        for res in resources['resources']:
-            sec = res['name']
-            sec_vars = res['name'] + ':vars'
-            user = 'ansible_user = %s' % res['win_username']
-            password = 'ansible_password = %s' % res['win_password']
-
-            if sec in data and sec_vars in data and user in data and \
-                    password in data:
-                count += 1
-
-            if count == len(resources['resources']):
-                LOG.debug('Reusing inventory file.')
-                return True
-    except KeyError as ex:
-        LOG.error('Required resource key %s missing!', ex)
-        raise SystemExit(1)
-    except IOError:
-        return False
-
-
-def create_inventory(filename, resources=None):
-    """Create a inventory file.
-
-    :param filename: inventory file
-    :param resources: windows resources
-    """
+    @classmethod
+    def get(cls, inventory_file):
+        """Return the context for an inventory file, refreshed if needed.
 
-    # can we reuse a existing inventory file?
-    if inventory_reuse(filename, resources):
-        return
+        :param inventory_file: ansible inventory file
+        :type inventory_file: str
+        :return: ansible context
+        :rtype: AnsibleContext
+        """
+        with cls._lock:
+            context = cls._contexts.get(inventory_file)
+            if context is None:
+                context = cls._contexts[inventory_file] = cls(inventory_file)
+            context.refresh()
+            return context
 
-    config = RawConfigParser()
+    def changed(self):
+        """Check if the inventory file changed since it was last parsed.
 
-    for item in resources['resources']:
-        section = item['name'].replace(" ", "")
-        config.add_section(section)
+        The file modification time and size are checked first, the content
+        is only hashed when they differ.
 
+        :return: whether the inventory file changed
+        :rtype: bool
+        """
         try:
-            config.set(section, str(item['public_v4']))
-        except KeyError:
-            config.set(section, item['ip'])
-
-        section = section + ":vars"
-        config.add_section(section)
-        config.set(section, "ansible_user", item['win_username'])
-        config.set(section, "ansible_password", item['win_password'])
-        config.set(section, "ansible_port", "5986")
-        config.set(section, "ansible_connection", "winrm")
-        config.set(section, "ansible_winrm_server_cert_validation",
-                   "ignore")
-
-        file_mgmt('w', filename, cfg_parser=config)
+            stat = os.stat(self.inventory_file)
+            stat = (stat.st_mtime, stat.st_size)
+        except OSError:
+            stat = digest = None
+        else:
+            if stat == self.stat:
+                return False
+            with open(self.inventory_file, 'rb') as f:
+                digest = sha1(f.read()).hexdigest()
+
+        self.stat = stat
+        if self.inventory is not None and digest == self.digest:
+            return False
+        self.digest = digest
+        return True
+
+    def refresh(self):
+        """Parse the inventory when it is new or its file changed."""
+        if not self.changed():
+            return
+
+        LOG.debug('Loading inventory %s.', self.inventory_file)
+        loader = DataLoader()
+        try:
+            # < 2.4
+            self.inventory = Inventory(
+                loader=loader,
+                variable_manager=VariableManager(),
+                host_list=self.inventory_file
+            )
+        except TypeError:
+            # > 2.4
+            self.inventory = Inventory(
+                loader=loader,
+                sources=self.inventory_file
+            )
 
-        # clean file, remove '= None'
-        inv_data = file_mgmt('r', filename)
-        inv_data = inv_data.replace(' = None', '')
-        file_mgmt('w', filename, inv_data)
+    def variable_manager(self, loader):
+        """Create a variable manager using the shared inventory.
 
-        LOG.debug("Inventory file %s created.", filename)
+        :param loader: data loader of the call
+        :type loader: DataLoader
+        :return: new variable manager
+        :rtype: VariableManager
+        """
+        try:
+            # > 2.4
+            var_mgr = VariableManager(loader=loader)
+        except TypeError:
+            # < 2.4
+            var_mgr = VariableManager()
+        var_mgr.set_inventory(self.inventory)
+        return var_mgr
 
 
 class PawsCallback(CallbackBase):
@@ -217,9 +232,10 @@ class ResultsHandler(object):
 
         LOG.info("Ansible call %s!", status)
 
-        if self.callback.contacted and self.callback.\
-                contacted[0]['success'] is False:
-            LOG.error(self.callback.contacted[0]['results']['msg'])
+        for item in self.callback.contacted:
+            if item['success'] is False:
+                LOG.error('%s: %s' % (item['host'],
+                                      item['results'].get('msg')))
 
     def abort(self):
         """Abort the program."""
@@ -323,31 +339,23 @@ class BaseCall(object):
 
         :param user_dir: user directory
         """
-        self.loader = DataLoader()
         self.inventory_file = os.path.join(user_dir, ANSIBLE_INVENTORY)
         self.callback = PawsCallback()
+        self.loader = None
         self.inventory = None
         self.var_mgr = None
 
     def _set_inventory(self):
-        """Set inventory class req. by ansible api."""
-        try:
-            # < 2.4
-            self.var_mgr = VariableManager()
-            self.inventory = Inventory(
-                loader=self.loader,
-                variable_manager=self.var_mgr,
-                host_list=self.inventory_file
-            )
-        except TypeError:
-            # > 2.4
-            self.var_mgr = VariableManager(loader=self.loader)
-            self.inventory = Inventory(
-                loader=self.loader,
-                sources=self.inventory_file
-            )
-        finally:
-            self.var_mgr.set_inventory(self.inventory)
+        """Set inventory class req. by ansible api.
+
+        The inventory comes from the shared ansible context, the inventory
+        file is only parsed again when it changed. The data loader and
+        variable manager are new for every call.
+        """
+        context = AnsibleContext.get(self.inventory_file)
+        self.loader = DataLoader()
+        self.var_mgr = context.variable_manager(self.loader)
+        self.inventory = context.inventory
 
 
 class PlayCall(BaseCall):
@@ -374,7 +382,8 @@ class PlayCall(BaseCall):
             ]
         )
 
-    @retry(AnsibleRuntimeError, tries=3)
+    @retry(AnsibleRuntimeError, tries=ANSIBLE_TRIES,
+           delay=ANSIBLE_RETRY_DELAY)
     def run(self, play, remote_user="root", become=False,
             become_method="sudo", become_user="root",
             private_key_file=None, default_callback=False,
@@ -447,7 +456,7 @@ class PlayCall(BaseCall):
             )
 
             # run play
-            with spinner():
+            with ANSIBLE_LOCK, spinner():
                 result = tqm.run(play)
 
             # process results
@@ -472,6 +481,8 @@ class PlaybookCall(BaseCall):
         :param user_dir: user directory
         """
         super(PlaybookCall, self).__init__(user_dir)
+        self.failed_hosts = set()
+        self.processed_hosts = set()
         self.options = namedtuple(
             'Options', [
                 'connection',
@@ -491,13 +502,25 @@ class PlaybookCall(BaseCall):
             ]
         )
 
-    @retry(AnsibleRuntimeError, tries=3)
-    def run(self, playbook, extra_vars=None, become=False,
-            become_method="sudo", become_user="root",
-            remote_user="root", private_key_file=None,
-            default_callback=False, results_class=ResultsHandler):
+    @retry(AnsibleRuntimeError, tries=ANSIBLE_TRIES,
+           delay=ANSIBLE_RETRY_DELAY)
+    def run(self, *args, **kwargs):
+        """Run the given playbook, again when it fails.
+
+        The playbook runs again against all hosts, see run_once for the
+        parameters.
+        """
+        return self.run_once(*args, **kwargs)
+
+    def run_once(self, playbook, extra_vars=None, become=False,
+                 become_method="sudo", become_user="root",
+                 remote_user="root", private_key_file=None,
+                 default_callback=False, results_class=ResultsHandler):
         """Run the given playbook.
 
+        Hosts which failed or were unreachable are saved to failed_hosts and
+        hosts the playbook ran against to processed_hosts.
+
         :param playbook: playbook file
         :param extra_vars: additional variables for playbook
         :param remote_user: remote user used during connection
@@ -511,6 +534,8 @@ class PlaybookCall(BaseCall):
 
         # create callback object
         self.callback = PawsCallback()
+        self.failed_hosts = set()
+        self.processed_hosts = set()
 
         # create inventory object
         self._set_inventory()
@@ -533,9 +558,9 @@ class PlaybookCall(BaseCall):
             diff=False
         )
 
-        # set additional playbook variables
+        # set additional playbook variables, a copy the caller can not change
         if extra_vars is not None:
-            self.var_mgr.extra_vars = extra_vars
+            self.var_mgr.extra_vars = dict(extra_vars)
 
         LOG.info('Running playbook: %s' % playbook)
         if 'ps' in extra_vars:
@@ -558,16 +583,13 @@ class PlaybookCall(BaseCall):
         if not default_callback:
             runner._tqm._stdout_callback = self.callback
 
-        # save standard error stream
-        org_stderr = sys.stderr
-        # Redirect standard error stream to null
-        sys.stderr = open(os.devnull, 'w')
-
         try:
             # run playbook
-            with spinner():
+            with ANSIBLE_LOCK, spinner():
                 result = runner.run()
 
+            self.set_hosts_status(getattr(runner, '_tqm', None))
+
             # Process results
             proc = results_class(result, self.callback, default_callback)
             proc.process()
@@ -575,6 +597,19 @@ class PlaybookCall(BaseCall):
             raise SystemExit(1)
         except AnsibleRuntimeError as ex:
             raise ex
-        finally:
-            # Restore standard error stream
-            sys.stderr = org_stderr
+
+    def set_hosts_status(self, tqm):
+        """Save which hosts failed or were unreachable.
+
+        :param tqm: task queue manager which ran the playbook
+        :type tqm: TaskQueueManager
+        """
+        stats = getattr(tqm, '_stats', None)
+        if stats is not None:
+            self.processed_hosts = set(stats.processed)
+            self.failed_hosts = set(stats.failures) | set(stats.dark)
+
+        for item in self.callback.contacted:
+            self.processed_hosts.add(item['host'])
+            if item['success'] is False:
+                self.failed_hosts.add(item['host'])
@@ -0,0 +1,281 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Module containing the resources state backends.
+
+Resources provisioned by paws are saved to resources.paws by default. The
+sqlite backend saves them to a SQLite database in the user directory instead,
+one row per resource indexed by name and provider. Providers update their own
+rows and resources.paws is exported once the providers action is done, so
+tasks reading resources.paws keep working.
+"""
+
+import sqlite3
+from contextlib import closing, contextmanager
+from json import dumps, loads
+from logging import getLogger
+from threading import Lock
+
+from os import environ
+from os.path import dirname, exists, join
+
+from paws.constants import RESOURCES_STATE_DB, STATE_BACKEND_ENV, \
+    STATE_DB_TIMEOUT
+from paws.helpers import cleanup, file_mgmt
+
+LOG = getLogger(__name__)
+
+__all__ = [
+    'StateStore', 'get_state_backend', 'read_resources_paws',
+    'write_resources_paws'
+]
+
+
+class StateStore(object):
+    """SQLite resources state.
+
+    Resources are saved as json in one row each, keyed by resource name and
+    indexed by provider name. Rows keep their position when updated so the
+    exported resources.paws keeps the provisioning order.
+    """
+
+    _stores = dict()
+    _lock = Lock()
+
+    def __init__(self, db_file):
+        """Constructor.
+
+        :param db_file: SQLite database file
+        :type db_file: str
+        """
+        self.db_file = db_file
+
+        with self.connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS resources ('
+                'name TEXT PRIMARY KEY, '
+                'provider TEXT NOT NULL, '
+                'data TEXT NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS resources_provider '
+                'ON resources (provider)'
+            )
+
+    @classmethod
+    def get(cls, userdir):
+        """Return the state store of a user directory.
+
+        :param userdir: user directory
+        :type userdir: str
+        :return: state store
+        :rtype: StateStore
+        """
+        db_file = join(userdir, RESOURCES_STATE_DB)
+        with cls._lock:
+            store = cls._stores.get(db_file)
+            if store is None or not exists(db_file):
+                store = cls._stores[db_file] = cls(db_file)
+            return store
+
+    @contextmanager
+    def connect(self):
+        """Open a connection to the database, in a transaction.
+
+        The transaction is committed (rolled back on errors) and the
+        connection closed on exit. Connections are not shared between
+        threads, providers running concurrently each open their own.
+
+        :return: database connection
+        :rtype: sqlite3.Connection
+        """
+        with closing(sqlite3.connect(self.db_file,
+                                     timeout=STATE_DB_TIMEOUT)) as conn:
+            with conn:
+                yield conn
+
+    @staticmethod
+    def _upsert(conn, provider, resources):
+        """Insert or update resources rows using an open connection."""
+        for res in resources:
+            row = (provider, dumps(res, sort_keys=True), res['name'])
+            cursor = conn.execute(
+                'UPDATE resources SET provider = ?, data = ? WHERE name = ?',
+                row
+            )
+            if not cursor.rowcount:
+                conn.execute(
+                    'INSERT INTO resources (provider, data, name) '
+                    'VALUES (?, ?, ?)',
+                    row
+                )
+
+    def upsert(self, provider, resources):
+        """Insert or update resources of a provider.
+
+        :param provider: provider name
+        :type provider: str
+        :param resources: resources
+        :type resources: list
+        """
+        with self.connect() as conn:
+            self._upsert(conn, provider, resources)
+
+    def delete(self, names):
+        """Delete resources by name.
+
+        :param names: resources names
+        :type names: list
+        """
+        with self.connect() as conn:
+            conn.executemany('DELETE FROM resources WHERE name = ?',
+                             [(name,) for name in names])
+
+    def replace(self, provider, resources):
+        """Replace all resources of a provider.
+
+        :param provider: provider name
+        :type provider: str
+        :param resources: resources of the provider
+        :type resources: list
+        """
+        names = set(res['name'] for res in resources)
+        with self.connect() as conn:
+            stale = [row for row in conn.execute(
+                'SELECT name FROM resources WHERE provider = ?', (provider,))
+                if row[0] not in names]
+            conn.executemany('DELETE FROM resources WHERE name = ?', stale)
+            self._upsert(conn, provider, resources)
+
+    def query(self, provider=None, names=None):
+        """Get resources, in the order they were first saved.
+
+        :param provider: only resources of this provider
+        :type provider: str
+        :param names: only resources with these names
+        :type names: list
+        :return: resources
+        :rtype: list
+        """
+        sql, params = 'SELECT data FROM resources', []
+        where = list()
+        if provider is not None:
+            where.append('provider = ?')
+            params.append(provider)
+        if names is not None:
+            where.append('name IN (%s)' % ', '.join('?' * len(names)))
+            params.extend(names)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+
+        with self.connect() as conn:
+            rows = conn.execute(sql + ' ORDER BY rowid', params).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def count(self):
+        """Return the number of resources saved."""
+        with self.connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM resources').fetchone()[0]
+
+    def load(self, resources_paws_file):
+        """Import an existing resources.paws file, if the store is empty.
+
+        :param resources_paws_file: resources.paws file
+        :type resources_paws_file: str
+        """
+        if self.count() or not exists(resources_paws_file):
+            return
+
+        from paws.providers import Provider
+
+        resources_paws = file_mgmt('r', resources_paws_file) or dict()
+        index = Provider.index_by_provider(
+            resources_paws.get('resources', list()))
+        for provider, resources in index.items():
+            self.upsert(provider, resources)
+        LOG.debug('Imported %s into %s', resources_paws_file, self.db_file)
+
+    def export(self, resources_paws_file):
+        """Write all resources to resources.paws.
+
+        resources.paws is removed when there are no resources.
+
+        :param resources_paws_file: resources.paws file
+        :type resources_paws_file: str
+        """
+        resources = self.query()
+        if resources:
+            file_mgmt('w', resources_paws_file, dict(resources=resources))
+            LOG.debug('Exported %s to %s', self.db_file, resources_paws_file)
+        else:
+            cleanup([resources_paws_file])
+
+
+def get_state_backend():
+    """Return the resources state backend in use.
+
+    :return: state backend name
+    :rtype: str
+    """
+    return environ.get(STATE_BACKEND_ENV, 'file')
+
+
+def read_resources_paws(resources_paws_file, provider=None):
+    """Read the resources saved by paws.
+
+    :param resources_paws_file: resources.paws file
+    :type resources_paws_file: str
+    :param provider: only resources of this provider (sqlite backend)
+    :type provider: str
+    :return: resources.paws content, None when nothing was saved
+    :rtype: dict
+    """
+    if get_state_backend() == 'sqlite':
+        store = StateStore.get(dirname(resources_paws_file))
+        store.load(resources_paws_file)
+        resources = store.query(provider)
+        return dict(resources=resources) if resources else None
+
+    if exists(resources_paws_file):
+        return file_mgmt('r', resources_paws_file)
+    return None
+
+
+def write_resources_paws(resources_paws_file, resources_paws, provider):
+    """Save the resources of a provider.
+
+    The file backend writes resources.paws. The sqlite backend replaces the
+    provider rows, resources.paws is exported by the caller of the provider.
+
+    :param resources_paws_file: resources.paws file
+    :type resources_paws_file: str
+    :param resources_paws: resources.paws content
+    :type resources_paws: dict
+    :param provider: provider name or alias writing its resources
+    :type provider: str
+    """
+    if get_state_backend() != 'sqlite':
+        file_mgmt('w', resources_paws_file, resources_paws)
+        return
+
+    from paws.providers import Provider
+
+    provider = Provider.get_provider_name(provider)
+    resources = [res for res in resources_paws['resources']
+                 if Provider.get_provider_name(res['provider']) == provider]
+    StateStore.get(dirname(resources_paws_file)).replace(provider, resources)
@@ -20,12 +20,13 @@
 
 from logging import getLogger
 
-from os.path import join
+from os.path import exists, join
 
 from paws.constants import ADMINISTRATOR, ADMINISTRADOR_PWD, ADMIN
 from paws.constants import WIN_EXEC_YAML
+from paws.constants import WIN_VARS_PATH
 from paws.exceptions import SSHError
-from paws.helpers import exec_cmd_by_ssh, get_ssh_conn
+from paws.helpers import SSH_POOL, exec_cmd_by_ssh, get_ssh_conn
 from paws.helpers import file_mgmt
 
 LOG = getLogger(__name__)
@@ -33,14 +34,28 @@ LOG = getLogger(__name__)
 __all__ = ['create_ps_exec_playbook', 'set_administrator_password',
            'ipconfig_release', 'rearm_server']
 
+# playbooks created by this process, see create_ps_exec_playbook
+_PS_EXEC_PLAYBOOKS = set()
+
 
 def create_ps_exec_playbook(user_dir, play_vars):
     """Creates the playbook to execute Windows PowerShell scripts.
 
+    There is one playbook per variables variant (file, str or none). A
+    playbook is only written once per process, later calls return the
+    existing file. Playbooks are left in the user directory, tasks running
+    concurrently may be using them.
+
     :param user_dir: user directory
     :param play_vars: determines if playbook vars are required
     """
-    filename = join(user_dir, WIN_EXEC_YAML)
+    if play_vars not in ['file', 'str']:
+        play_vars = None
+
+    filename = join(user_dir, WIN_EXEC_YAML % (play_vars or 'none'))
+    if filename in _PS_EXEC_PLAYBOOKS and exists(filename):
+        return filename
+
     playbook = dict(
         gather_facts='False',
         hosts='{{ hosts }}',
@@ -48,7 +63,7 @@ def create_ps_exec_playbook(user_dir, play_vars):
     )
 
     if play_vars == 'file':
-        playbook['vars'] = dict(win_var_path='c:/my_vars.json')
+        playbook['vars'] = dict(win_var_path=WIN_VARS_PATH)
         playbook['tasks'] = [
             dict(
                 name='Copy JSON vars to Windows system',
@@ -66,7 +81,7 @@ def create_ps_exec_playbook(user_dir, play_vars):
                 script='{{ ps }} {{ psv }}'
             )
         ]
-    elif play_vars is None:
+    else:
         playbook['tasks'] = [
             dict(
                 name='Execute PowerShell on Windows system',
@@ -75,6 +90,7 @@ def create_ps_exec_playbook(user_dir, play_vars):
         ]
 
     file_mgmt('w', filename, [playbook])
+    _PS_EXEC_PLAYBOOKS.add(filename)
     LOG.debug('Playbook %s created.', filename)
 
     return filename
@@ -183,20 +199,18 @@ def rearm_server(res):
         password=res['win_password']
     )
 
-    LOG.info('Attempt SSH connection to vm: %s.', res['name'])
-
-    # connect
-    get_ssh_conn(
+    # restart server, reusing the pooled connection
+    exec_cmd_by_ssh(
         res['public_v4'],
         res['win_username'],
-        res['win_password']
+        'shutdown.exe /r /f /t 0',
+        password=res['win_password']
     )
 
-    # restart server
-    exec_cmd_by_ssh(
+    # the connection does not survive the restart
+    SSH_POOL.discard(
         res['public_v4'],
         res['win_username'],
-        'shutdown.exe /r /f /t 0',
-        password=res['win_password']
+        res['win_password']
     )
     LOG.debug('Successfully extended the rearm count for %s.' % res['name'])
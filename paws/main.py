@@ -24,9 +24,10 @@ from importlib import import_module
 from os import environ, getcwd
 from os.path import join, isdir
 
-from paws.constants import DEFAULT_USERDIR, LINE, PAWS_NAME
+from paws.constants import DEFAULT_USERDIR, LINE, PAWS_NAME, \
+    STATE_BACKEND_ENV
 from paws.core import LoggerMixin, TimeMixin
-from paws.helpers import file_mgmt
+from paws.helpers import FILE_CACHE
 
 
 class Paws(LoggerMixin, TimeMixin):
@@ -75,6 +76,11 @@ class Paws(LoggerMixin, TimeMixin):
 
         environ['ANSIBLE_CONFIG'] = join(user_dir, 'ansible.cfg')
 
+        # resources state backend, read by providers and tasks
+        state_backend = getattr(self.args, 'state_backend', None)
+        if state_backend:
+            environ[STATE_BACKEND_ENV] = state_backend
+
         self.logger.info(LINE)
         self.logger.info('Options'.center(45))
         self.logger.info(LINE)
@@ -92,7 +98,7 @@ class Paws(LoggerMixin, TimeMixin):
         if self.task.lower() == 'group':
             # read files
             try:
-                group = file_mgmt('r', join(user_dir, self.args.name))
+                group = FILE_CACHE.read(join(user_dir, self.args.name))
             except IOError as ex:
                 self.logger.error('Group file %s' % ex.message)
                 raise SystemExit(1)
@@ -107,16 +113,14 @@ class Paws(LoggerMixin, TimeMixin):
         else:
             # read files
             try:
-                credentials = file_mgmt(
-                    'r',
+                credentials = FILE_CACHE.read(
                     join(user_dir, self.args.credentials)
                 )
             except (AttributeError, IOError) as ex:
                 credentials = None
 
             try:
-                resources = file_mgmt(
-                    'r',
+                resources = FILE_CACHE.read(
                     join(user_dir, self.args.topology)
                 )
             except (AttributeError, IOError) as ex:
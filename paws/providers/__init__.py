@@ -18,10 +18,27 @@
 """Paws providers."""
 
 import importlib
+from os.path import exists, join
+from time import time
 
-from paws.constants import PROVIDERS
+from paws.compat import iter_entry_points
+from paws.constants import ANSIBLE_INVENTORY_FILENAME, PROVIDERS, \
+    PROVIDERS_ENTRY_POINTS, RESOURCES_PAWS
 from paws.core import LoggerMixin, Namespace
-from paws.helpers import cleanup
+from paws.exceptions import NotFound
+from paws.helpers import cleanup, concurrent_map, file_mgmt
+from paws.lib.inventory import create_inventory
+from paws.lib.state import StateStore, get_state_backend, \
+    read_resources_paws
+
+# registered providers by name and alias, see Provider.get_registry
+_REGISTRY = dict()
+
+# whether installed providers entry points were added to the registry
+_ENTRY_POINTS = []
+
+# provider classes already imported, by provider name
+_CLASSES = dict()
 
 
 class Provider(LoggerMixin):
@@ -88,8 +105,33 @@ class Provider(LoggerMixin):
         self.resources_paws_file = resources_paws_file
         self.verbose = verbose
 
+        # resources and credentials partitioned by provider in one pass
+        self.resources_index = self.index_by_provider(
+            self.resources['resources'])
+        self.credentials_index = dict()
+        if self.credentials:
+            for elem in reversed(self.credentials['credentials']):
+                self.credentials_index[
+                    self.get_provider_name(elem['provider'])] = elem
+
         self.provider_list = self.get_provider()
 
+    @classmethod
+    def index_by_provider(cls, resources):
+        """Partition resources by provider name.
+
+        :param resources: system resources
+        :type resources: list
+        :return: resources by provider name
+        :rtype: dict
+        """
+        index = dict()
+        for resource in resources:
+            index.setdefault(
+                cls.get_provider_name(resource['provider']), []).append(
+                    resource)
+        return index
+
     def get_provider(self):
         """ Get provider from all elements declared in resources.yaml or
         topology file and return a list with non-duplicated elements
@@ -97,113 +139,304 @@ class Provider(LoggerMixin):
         :return: list with providers extracted from topology file
         :rtype: set
         """
-        provider_list = set()
-
-        for resource in self.resources['resources']:
-            provider_list.add(resource['provider'])
-
-        return provider_list
+        return set(self.resources_index)
 
     def get_resources_by_provider(self, provider):
         """Get system resources by provider name from a given file.
-        Open the file and search for all system resources defined by
-        the provider passed as parameter
+        Return all system resources defined by the provider passed as
+        parameter
 
         :param provider: name of registered provider supported by PAWS
         :type provider: str
         :return: content from resources.yaml and .paws files
         :rtype: list contains one or more lists of dicts
         """
-        resource_list = []
-
-        for elem in self.resources['resources']:
-            if provider in elem['provider']:
-                resource_list.append(elem)
-        return resource_list
+        return list(self.resources_index.get(
+            self.get_provider_name(provider), []))
 
     def get_creds_by_provider(self, provider):
         """Get credentials by provider name from a given file.
-        Open the file and search by provider passed as parameter
+        Return the first credentials declared for the provider passed as
+        parameter
 
         :param provider: name of registered provider supported by PAWS
         :type provider: str
         :return: content from credentials.yaml
         :rtype: dict
         """
-        if self.credentials:
-            for elem in self.credentials['credentials']:
-                if provider in elem['provider']:
-                    return elem
+        return self.credentials_index.get(self.get_provider_name(provider))
 
     @staticmethod
-    def get_provider_info_by_name(provider_name):
+    def get_registry(discover=False):
+        """Get the registered providers indexed by name and aliases.
+
+        Providers shipped with PAWS are always registered. Providers
+        installed by other packages are registered under the paws.providers
+        entry points group, they are only discovered when asked for.
+
+        :param discover: add the providers installed by other packages
+        :type discover: bool
+        :return: provider registration by name
+        :rtype: dict
+        """
+        if not _REGISTRY:
+            for provider in PROVIDERS:
+                for name in [provider['name']] + provider.get('aliases', []):
+                    _REGISTRY[name] = provider
+
+        if discover and not _ENTRY_POINTS:
+            _ENTRY_POINTS.append(True)
+            for entry_point in iter_entry_points(PROVIDERS_ENTRY_POINTS):
+                _REGISTRY.setdefault(entry_point.name, dict(
+                    name=entry_point.name, entry_point=entry_point))
+
+        return _REGISTRY
+
+    @classmethod
+    def get_provider_name(cls, name):
+        """Get the registered name of a provider name or alias.
+
+        :param name: name or alias of provider
+        :type name: str
+        :return: registered provider name, the name given when unknown
+        :rtype: str
+        """
+        provider = cls.get_provider_info_by_name(name)
+        return provider['name'] if provider else name
+
+    @classmethod
+    def get_provider_info_by_name(cls, provider_name):
         """Get registration info from provider passed as parameter.
-        this method retrieve Code/Object information from Constants
-        module and it is used as a helper function for dynamic object
+        this method retrieve Code/Object information from the providers
+        registry and it is used as a helper function for dynamic object
         creation
 
-        :param provider_name: name of provider
+        :param provider_name: name or alias of provider
         :type provider_name: str
         :return provider registration
         :rtype provider: dict
         """
-        for provider in PROVIDERS:
-            if provider_name in provider['name']:
-                return provider
+        provider = cls.get_registry().get(provider_name)
+        if provider is None:
+            provider = cls.get_registry(discover=True).get(provider_name)
+        return provider
 
     def get_provider_class(self, name):
-        """Get the provider class.
+        """Get the provider class, loaded the first time it is needed.
 
         :param name: Provider class name.
         :type name: str
         """
         prov_info = self.get_provider_info_by_name(name)
-        my_module = importlib.import_module(prov_info['module'])
-        klass = getattr(my_module, prov_info['class'])
+        if prov_info is None:
+            raise NotFound('Provider %s is not supported.' % name)
+
+        klass = _CLASSES.get(prov_info['name'])
+        if klass is None:
+            if 'entry_point' in prov_info:
+                klass = prov_info['entry_point'].load()
+            else:
+                my_module = importlib.import_module(prov_info['module'])
+                klass = getattr(my_module, prov_info['class'])
+            _CLASSES[prov_info['name']] = klass
         return klass
 
+    def get_namespace(self, provider_name):
+        """Get the arguments given to a registered provider.
+
+        :param provider_name: name of registered provider supported by PAWS
+        :type provider_name: str
+        :return: provider arguments
+        :rtype: Namespace
+        """
+        # create new namespace
+        namespace = Namespace(dict())
+
+        # set attributes for namespace
+        namespace.userdir = self.userdir
+        namespace.resources_paws_file = self.resources_paws_file
+        namespace.verbose = self.verbose
+
+        # get resources by provider
+        namespace.resources = self.get_resources_by_provider(provider_name)
+
+        # get provider credentials for resources
+        namespace.credentials = self.get_creds_by_provider(provider_name)
+
+        return namespace
+
+    def stage_resources_paws(self, namespaces):
+        """Give each provider its own resources.paws file.
+
+        Providers running concurrently would overwrite each others
+        resources.paws. Each one gets a staging file holding its own entries
+        of resources.paws instead, merged back by merge_resources_paws.
+
+        :param namespaces: providers arguments by provider name
+        :type namespaces: dict
+        :return: resources.paws content
+        :rtype: dict
+        """
+        resources_paws = dict(resources=list())
+        if exists(self.resources_paws_file):
+            resources_paws = file_mgmt('r', self.resources_paws_file) or \
+                resources_paws
+
+        index = self.index_by_provider(resources_paws['resources'])
+        for provider_name, namespace in namespaces.items():
+            namespace.resources_paws_file = join(
+                self.userdir, '.%s.%s' % (provider_name, RESOURCES_PAWS))
+            entries = index.get(provider_name)
+            if entries:
+                file_mgmt('w', namespace.resources_paws_file,
+                          dict(resources=entries))
+            else:
+                cleanup([namespace.resources_paws_file])
+
+        return resources_paws
+
+    def merge_resources_paws(self, namespaces, resources_paws):
+        """Merge the providers staging files into resources.paws.
+
+        Entries of providers which did not run are preserved.
+
+        :param namespaces: providers arguments by provider name
+        :type namespaces: dict
+        :param resources_paws: resources.paws content before the action
+        :type resources_paws: dict
+        """
+        resources = [elem for elem in resources_paws['resources']
+                     if self.get_provider_name(elem['provider'])
+                     not in namespaces]
+
+        for provider_name in sorted(namespaces):
+            namespace = namespaces[provider_name]
+            if exists(namespace.resources_paws_file):
+                resources.extend(file_mgmt(
+                    'r', namespace.resources_paws_file)['resources'])
+                cleanup([namespace.resources_paws_file])
+
+        if resources:
+            file_mgmt('w', self.resources_paws_file,
+                      dict(resources=resources))
+        else:
+            cleanup([self.resources_paws_file])
+
+    def create_inventory(self):
+        """Create the ansible inventory with the resources of all providers.
+
+        It is created from resources.paws once every provider is done, so it
+        holds the hosts of all providers.
+        """
+        resources_paws = read_resources_paws(self.resources_paws_file)
+        if not resources_paws:
+            return
+
+        resources = [res for res in resources_paws['resources']
+                     if res.get('public_v4') or res.get('ip')]
+        if resources:
+            create_inventory(join(self.userdir, ANSIBLE_INVENTORY_FILENAME),
+                             dict(resources=resources))
+
     def run_action(self, action):
         """ Read resources.yaml and get the providers from all element
         declared to be provisioned. Then filter elements by provider
-        in a loop and using dynamic class with importlib module
-        create a class of provider from list of providers of
-        resources.yaml and call the method passed as action parameter
+        and using dynamic class with importlib module create a class of
+        provider from list of providers of resources.yaml and call the
+        method passed as action parameter.
+
+        Providers garbage collectors run first, then all providers run the
+        action at the same time. Their resources are merged and each
+        provider status and duration is reported. With the sqlite state
+        backend providers save their resources to the state store, which is
+        exported to resources.paws once.
 
         :param action: name of method to be executed
         :type action: str
+        :return: resources of all providers
+        :rtype: dict
         """
-        for provider_name in self.provider_list:
-            # create new namespace
-            namespace = Namespace(dict())
+        providers = list()
+        for provider_name in sorted(self.provider_list):
+            # get provider class
+            klass = self.get_provider_class(provider_name)
 
-            # set attributes for namespace
-            namespace.userdir = self.userdir
-            namespace.resources_paws_file = self.resources_paws_file
-            namespace.verbose = self.verbose
+            if not hasattr(klass, action):
+                self.logger.warning('Provider %s does not support %s.' %
+                                    (provider_name, action))
+                continue
 
-            # get resources by provider
-            namespace.resources = self.get_resources_by_provider(provider_name)
+            providers.append((provider_name, klass))
 
-            # get provider credentials for resources
-            namespace.credentials = self.get_creds_by_provider(provider_name)
+        if not providers:
+            return dict(resources=list())
 
-            # get provider class
-            klass = self.get_provider_class(provider_name)
+        namespaces = dict((provider_name, self.get_namespace(provider_name))
+                          for provider_name, _ in providers)
+
+        store = None
+        if get_state_backend() == 'sqlite':
+            store = StateStore.get(self.userdir)
+            store.load(self.resources_paws_file)
+
+        # providers share resources.paws when running concurrently
+        staged = store is None and len(providers) > 1
+        if staged:
+            resources_paws = self.stage_resources_paws(namespaces)
 
+        instances = list()
+        for provider_name, klass in providers:
             # create instance
-            inst = klass(namespace)
-
-            # run provider's garbage collector
-            # TODO: what about multiple resources? we should or not
-            # delete self.resources_paws ?
-            # in a case that resources.paws exists and the provider running
-            # is different then what described in resources.paws maybe the
-            # providers should be responsible to preserve data and then append
-            # new data into the file ? if resources.paws doesn't exist than
-            # it is fine to just create and add new data to it?
-            cleanup(inst.garbage_collector(), self.userdir)
-
-            self.logger.debug('Executing %s.' % action)
-
-            # call method
-            return getattr(inst, action)()
+            inst = klass(namespaces[provider_name])
+
+            # run provider's garbage collector, before any provider runs. The
+            # pool action leaves the provisioned resources untouched.
+            if action != 'pool':
+                garbage = inst.garbage_collector()
+                cleanup(garbage, self.userdir)
+                staging = namespaces[provider_name].resources_paws_file
+                if store is not None and staging in garbage:
+                    store.replace(provider_name, list())
+
+            instances.append((provider_name, inst))
+
+        durations = dict()
+
+        def call(item):
+            provider_name, inst = item
+            start = time()
+            try:
+                self.logger.debug('Executing %s on %s.' %
+                                  (action, provider_name))
+                return getattr(inst, action)()
+            finally:
+                durations[provider_name] = time() - start
+
+        results = concurrent_map(call, instances, len(instances))
+
+        if staged:
+            self.merge_resources_paws(namespaces, resources_paws)
+        elif store is not None:
+            store.export(self.resources_paws_file)
+
+        # providers running concurrently can not each write the inventory
+        if action == 'provision':
+            self.create_inventory()
+
+        resources, errors = list(), list()
+        for (provider_name, _), (result, error) in zip(instances, results):
+            if error is not None:
+                self.logger.error('Provider %s %s failed in %.1fs: %s' % (
+                    provider_name, action, durations[provider_name],
+                    getattr(error, 'message', error)))
+                errors.append(error)
+                continue
+            self.logger.info('Provider %s %s succeeded in %.1fs.' % (
+                provider_name, action, durations[provider_name]))
+            if result:
+                resources.extend(result['resources'])
+
+        if errors:
+            raise errors[0]
+
+        return dict(resources=resources)
@@ -32,9 +32,10 @@ from requests import HTTPError, RequestException, get
 from paws.compat import urlopen
 from paws.constants import LIBVIRT_OUTPUT, LIBVIRT_AUTH_HELP, \
     ANSIBLE_INVENTORY_FILENAME
-from paws.helpers import get_ssh_conn, file_mgmt, subprocess_call, cleanup, \
+from paws.helpers import wait_for_ssh, subprocess_call, cleanup, \
     retry
-from paws.lib.remote import create_inventory, inventory_init
+from paws.lib.inventory import inventory_init
+from paws.lib.state import read_resources_paws, write_resources_paws
 
 """
     Libvirt provider, It is a wrapper interacting with Libvirt
@@ -193,6 +194,7 @@ class Libvirt(object):
         # check libvirt connection - validating authentication
         conn = self.util.get_connection()
 
+        systems = list()
         for elem in self.resources:
             LOG.info('Working to provision %s VM on %s' % (elem['name'],
                                                            elem['provider']))
@@ -220,25 +222,23 @@ class Libvirt(object):
                 # get vm info
                 vm_info = self.util.get_vm_info(conn, elem)
 
-                # loop to get SSH connection with auto-retry
-                try:
-                    get_ssh_conn(vm_info['ip'], elem['win_username'],
-                                 elem['win_password'])
-                except Exception as ex:
-                    LOG.error(ex)
+                # ssh connection is checked for all vms once booted
+                systems.append(dict(host=vm_info['ip'],
+                                    username=elem['win_username'],
+                                    password=elem['win_password']))
             except Exception:
                 LOG.debug("An error happened during provision VM %s trying \
                 forced teardown" % elem['name'])
                 self.teardown()
 
-            # @attention Libvirt provider doesn't need hosts inventory file but
-            # it is required by Winsetup and Group.
-            # preparing resource to be compatible with ansible create inventory
+            # the hosts inventory required by Winsetup and Group is created
+            # from resources.paws once every provider is done
             elem['ip'] = vm_info['ip']  # append ip to resource
-            res = {}
-            list_resources = [elem]
-            res['resources'] = list_resources
-            create_inventory(self.inventory, res)
+
+        # wait for all vms to accept ssh connections at once
+        for host, ready in wait_for_ssh(systems).items():
+            if not ready:
+                LOG.error('Unable to establish SSH connection to %s.' % host)
 
         self.util.generate_resources_paws(conn)
 
@@ -723,17 +723,16 @@ class Util(object):
 
         # Write resources.paws
         if len(vms) > 0:
-            if exists(self.args.resources_paws_file):
-                res_paws = file_mgmt('r', self.args.resources_paws_file)
-
+            res_paws = read_resources_paws(self.args.resources_paws_file)
+            if res_paws:
                 for x in res_paws['resources']:
                     if x['provider'] != self.args.name:
                         vms.append(x)
 
             self.args.resources_paws = {'resources': vms}
-            file_mgmt(
-                'w',
+            write_resources_paws(
                 self.args.resources_paws_file,
-                self.args.resources_paws
+                self.args.resources_paws,
+                self.args.__provider_name__
             )
             LOG.debug("Successfully created %s", self.args.resources_paws_file)
@@ -16,29 +16,34 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from time import sleep
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_UN
+from hashlib import sha1
+from importlib import import_module
+from json import dumps
+from threading import Condition, Lock
+from time import sleep, time
 from uuid import uuid4
 
 import random
 import urllib3
-from click_spinner import spinner
 from copy import deepcopy
 from libcloud import security
 from libcloud.common.types import InvalidCredsError
 from libcloud.compute.providers import get_driver
 from libcloud.compute.types import Provider
 from os import getenv
-from os.path import exists
+from os.path import exists, join
 from requests.exceptions import ConnectionError
 
 from paws.constants import ADMINISTRADOR_PWD, ADMINISTRATOR, \
-    OPENSTACK_ENV_VARS, PROVISION_RESOURCE_KEYS
-from paws.core import LoggerMixin
+    OPENSTACK_CATALOG, OPENSTACK_ENV_VARS, OPENSTACK_FLOATING_IPS, \
+    OPENSTACK_OPTIONS, OPENSTACK_POOL, PROVISION_RESOURCE_KEYS
+from paws.core import LoggerMixin, Namespace
 from paws.exceptions import SSHError, ProvisionError, \
     NotFound, BootError, BuildError, NetworkError, TeardownError
-from paws.helpers import file_mgmt
-from paws.lib.remote import PlayCall
-from paws.lib.remote import create_inventory
+from paws.helpers import concurrent_map, file_mgmt
+from paws.lib.state import write_resources_paws
 from paws.lib.windows import set_administrator_password, ipconfig_release
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -46,16 +51,500 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 MAX_ATTEMPTS = 3
 MAX_WAIT_TIME = 100
 
+# seconds given to a vm to finish building per provision attempt
+BUILD_ATTEMPT_TIME = 20
+
+# vm state polling intervals (seconds)
+POLL_MIN_DELAY = 5
+POLL_MAX_DELAY = 30
+POLL_BACKOFF = 1.5
+
+
+class NodeStatePoller(LoggerMixin):
+    """Shared vm state poller.
+
+    All vms waiting to finish building share one list_nodes request per
+    poll. The first waiter due for a poll performs the request and notifies
+    the other waiters with the new vm states. Polls start with a short delay
+    which grows exponentially, it goes back to the short delay whenever a new
+    vm starts waiting.
+    """
+
+    def __init__(self, driver, min_delay=POLL_MIN_DELAY,
+                 max_delay=POLL_MAX_DELAY, backoff=POLL_BACKOFF):
+        """Constructor.
+
+        :param driver: libcloud driver
+        :param min_delay: delay before the first poll
+        :param max_delay: maximum delay between polls
+        :param backoff: multiplier applied to the delay after each poll
+        """
+        self.driver = driver
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+
+        self._cond = Condition()
+        self._nodes = dict()
+        self._waiting = dict()
+        self._polling = False
+        self._polls = 0
+        self._next_poll = float('inf')
+
+    @property
+    def delay(self):
+        """Return the delay before the next poll."""
+        return min(self.min_delay * self.backoff ** self._polls,
+                   self.max_delay)
+
+    def poll(self):
+        """Get the state of all vms with a single request.
+
+        Must be called holding the lock, which is released during the request.
+        """
+        self._polling = True
+        self._cond.release()
+        try:
+            nodes = self.driver.list_nodes()
+        except Exception as ex:
+            nodes = None
+            self.logger.warning('Unable to get vms state: %s', ex)
+        finally:
+            self._cond.acquire()
+            self._polling = False
+
+        if nodes is not None:
+            self._nodes = dict((node.id, node) for node in nodes)
+
+        self._polls += 1
+        self._next_poll = time() + self.delay
+
+        for node_id, name in self._waiting.items():
+            node = self._nodes.get(node_id)
+            self.logger.info('VM %s, STATE=%s, rechecking in %d seconds.',
+                             name, getattr(node, 'state', 'unknown'),
+                             self.delay)
+        self._cond.notify_all()
+
+    def wait(self, node, timeout):
+        """Wait for a vm to be running.
+
+        :param node: libcloud node object
+        :param timeout: seconds to wait for the vm
+        :return: up to date libcloud node object
+        """
+        deadline = time() + timeout
+
+        with self._cond:
+            self._waiting[node.id] = node.name
+            self._polls = 0
+            self._next_poll = min(self._next_poll, time() + self.min_delay)
+
+            try:
+                while True:
+                    current = self._nodes.get(node.id)
+                    state = str(getattr(current, 'state', '')).lower()
+                    if state == 'running':
+                        return current
+                    elif state == 'error':
+                        raise BuildError('VM %s failed to build, STATE=%s.' %
+                                         (node.name, state))
+
+                    now = time()
+                    if now >= deadline:
+                        raise BuildError('VM %s was unable to finish '
+                                         'building.' % node.name)
+
+                    if not self._polling and now >= self._next_poll:
+                        self.poll()
+                    else:
+                        self._cond.wait(
+                            max(min(self._next_poll, deadline) - now, 0.1))
+            finally:
+                self._waiting.pop(node.id, None)
+
+
+class Catalog(LoggerMixin):
+    """OpenStack catalog cache.
+
+    Images, flavors, key pairs, networks and floating ip pools are listed
+    once per run and indexed by name and id. When a ttl is given, listings
+    are also saved to a file and reused by the following runs until they
+    expire. A lookup missing the cache lists the catalog again before giving
+    up, so objects created after the listing are still found.
+    """
+
+    # catalog kinds mapped to the driver method listing them
+    LISTINGS = {
+        'images': 'list_images',
+        'flavors': 'list_sizes',
+        'key_pairs': 'list_key_pairs',
+        'networks': 'ex_list_networks',
+        'floating_ip_pools': 'ex_list_floating_ip_pools'
+    }
+
+    # driver attributes referenced by the catalog objects
+    REFERENCES = ['connection', 'network_connection']
+
+    def __init__(self, driver, filename=None, ttl=0, key='default'):
+        """Constructor.
+
+        :param driver: libcloud driver
+        :param filename: file to save listings to
+        :param ttl: seconds a saved listing is valid, 0 disables the file
+        :param key: key identifying the cloud inside the file
+        """
+        self.driver = driver
+        self.filename = filename
+        self.ttl = int(ttl or 0)
+        self.key = key
+
+        self._lock = Lock()
+        self._indexes = dict()
+        self._saved = None
+
+    def get(self, kind, name):
+        """Get a catalog object by name or id.
+
+        :param kind: catalog kind
+        :param name: object name or id
+        :return: libcloud object or None when not found
+        """
+        with self._lock:
+            by_name, by_id, live = self._indexes.get(kind) or \
+                self.load(kind)
+
+            obj = by_name.get(name, by_id.get(str(name)))
+            if obj is None and not live:
+                by_name, by_id, live = self.load(kind, refresh=True)
+                obj = by_name.get(name, by_id.get(str(name)))
+            return obj
+
+    def load(self, kind, refresh=False):
+        """Load and index a catalog listing.
+
+        :param kind: catalog kind
+        :param refresh: skip the saved listing
+        :return: name index, id index and whether the listing is live
+        """
+        objects = None if refresh else self.read(kind)
+        live = objects is None
+
+        if live:
+            self.logger.debug('Listing OpenStack %s.', kind)
+            objects = getattr(self.driver, self.LISTINGS[kind])()
+            self.write(kind, objects)
+
+        by_name, by_id = dict(), dict()
+        for obj in objects:
+            by_name.setdefault(obj.name, obj)
+            if getattr(obj, 'id', None) is not None:
+                by_id.setdefault(str(obj.id), obj)
+
+        self._indexes[kind] = (by_name, by_id, live)
+        return self._indexes[kind]
+
+    def saved(self):
+        """Return the saved listings for this cloud."""
+        if self._saved is None:
+            self._saved = dict()
+            if self.ttl > 0 and self.filename and exists(self.filename):
+                try:
+                    content = file_mgmt('r', self.filename)
+                    self._saved = content.get(self.key, dict())
+                except (IOError, ValueError, AttributeError):
+                    self.logger.debug('Unable to read %s.', self.filename)
+        return self._saved
+
+    def read(self, kind):
+        """Rebuild libcloud objects from a saved listing.
+
+        :param kind: catalog kind
+        :return: libcloud objects or None when no listing is saved
+        """
+        listing = self.saved().get(kind)
+        if not listing or time() - listing['time'] >= self.ttl:
+            return None
+
+        objects = list()
+        for item in listing['items']:
+            module, name = item['class'].rsplit('.', 1)
+            obj = object.__new__(getattr(import_module(module), name))
+            obj.__dict__.update(item['data'])
+            for attr, ref in item['refs'].items():
+                setattr(obj, attr, getattr(self.driver, ref) if ref
+                        else self.driver)
+            objects.append(obj)
+        return objects
+
+    def write(self, kind, objects):
+        """Save a listing when the catalog file is enabled.
+
+        :param kind: catalog kind
+        :param objects: libcloud objects
+        """
+        if self.ttl <= 0 or not self.filename:
+            return
+
+        items = list()
+        for obj in objects:
+            data, refs = dict(), dict()
+            for attr, value in vars(obj).items():
+                if value is self.driver:
+                    refs[attr] = None
+                    continue
+                for ref in self.REFERENCES:
+                    if value is getattr(self.driver, ref, None):
+                        refs[attr] = ref
+                        break
+                else:
+                    data[attr] = value
+            items.append({
+                'class': '%s.%s' % (type(obj).__module__,
+                                    type(obj).__name__),
+                'data': data,
+                'refs': refs
+            })
+        self.saved()[kind] = dict(time=time(), items=items)
+
+        content = dict()
+        if exists(self.filename):
+            try:
+                content = file_mgmt('r', self.filename)
+            except (IOError, ValueError):
+                pass
+        content[self.key] = self._saved
+        try:
+            file_mgmt('w', self.filename, content)
+        except (IOError, TypeError) as ex:
+            self.logger.debug('Unable to save %s: %s', self.filename, ex)
+
+
+@contextmanager
+def locked_file(lock, filename):
+    """Lock a file shared by threads and by other paws processes.
+
+    :param lock: lock shared by the threads using the file
+    :param filename: file to lock, a lock file is created next to it
+    """
+    with lock:
+        with open(filename + '.lock', 'a') as f_lock:
+            flock(f_lock, LOCK_EX)
+            try:
+                yield
+            finally:
+                flock(f_lock, LOCK_UN)
+
+
+class FloatingIpReservations(LoggerMixin):
+    """Reserved floating ips manager.
+
+    Keeps up to size allocated but unattached floating ips per floating ip
+    pool, tracked in a file in the user directory. Provision takes its
+    floating ips from the reservations before creating new ones and teardown
+    gives them back instead of deleting them. The file is locked while it is
+    used, paws runs sharing a user directory never take the same floating ip.
+    """
+
+    def __init__(self, filename=None, size=0, key='default'):
+        """Constructor.
+
+        :param filename: file tracking the reserved floating ips
+        :param size: maximum floating ips kept per pool, 0 disables it
+        :param key: key identifying the cloud inside the file
+        """
+        self.filename = filename
+        self.size = int(size or 0)
+        self.key = key
+
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        """Return whether floating ips are reserved."""
+        return self.size > 0 and self.filename is not None
+
+    def load(self):
+        """Return the reserved floating ips file content."""
+        if exists(self.filename):
+            try:
+                return file_mgmt('r', self.filename)
+            except (IOError, ValueError):
+                self.logger.debug('Unable to read %s.', self.filename)
+        return dict()
+
+    def take(self, pool):
+        """Take a reserved floating ip.
+
+        :param pool: floating ip pool name
+        :return: floating ip with id and ip_address attributes or None
+        """
+        if not self.enabled:
+            return None
+
+        with locked_file(self._lock, self.filename):
+            content = self.load()
+            reserved = content.get(self.key, dict()).get(pool, list())
+            if not reserved:
+                return None
+            fip = reserved.pop(0)
+            file_mgmt('w', self.filename, content)
+
+        self.logger.debug('Took reserved floating ip %s.', fip['ip_address'])
+        return Namespace(fip)
+
+    def give_back(self, pool, fip):
+        """Give back a floating ip to the reservations.
+
+        :param pool: floating ip pool name
+        :param fip: libcloud floating ip object
+        :return: whether the floating ip was kept
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+
+        with locked_file(self._lock, self.filename):
+            content = self.load()
+            reserved = content.setdefault(self.key, dict()).setdefault(
+                pool, list())
+            if len(reserved) >= self.size:
+                return False
+            reserved.append(dict(id=fip.id, ip_address=fip.ip_address))
+            file_mgmt('w', self.filename, content)
+
+        self.logger.debug('Reserved floating ip %s.', fip.ip_address)
+        return True
+
+
+class WarmPool(LoggerMixin):
+    """Pool of ready vms.
+
+    Tracks vms booted ahead of time with their administrator password set,
+    in a file in the user directory. Pooled vms are grouped by the resource
+    settings they were booted with, a resource can only claim a vm booted
+    with the same settings. The file is locked while it is used, paws runs
+    sharing a user directory never claim the same vm.
+    """
+
+    # resource keys a pooled vm must match to be claimed
+    SPEC_KEYS = ['image', 'flavor', 'network', 'floating_ip_pools',
+                 'keypair', ADMINISTRADOR_PWD]
+
+    def __init__(self, filename, key='default'):
+        """Constructor.
+
+        :param filename: file tracking the pooled vms
+        :param key: key identifying the cloud inside the file
+        """
+        self.filename = filename
+        self.key = key
+
+        self._lock = Lock()
+
+    @classmethod
+    def spec(cls, res):
+        """Return the pool identifier for a resource.
+
+        :param res: windows resource
+        """
+        data = dict((key, res.get(key)) for key in cls.SPEC_KEYS)
+        return sha1(dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def locked(self):
+        """Lock the pool file, for threads and other paws processes."""
+        with locked_file(self._lock, self.filename):
+            yield
+
+    def load(self):
+        """Return the pool file content."""
+        if exists(self.filename):
+            try:
+                return file_mgmt('r', self.filename)
+            except (IOError, ValueError):
+                self.logger.debug('Unable to read %s.', self.filename)
+        return dict()
+
+    def entries(self, spec=None):
+        """Return the pooled vms.
+
+        :param spec: only return the vms of this pool
+        """
+        with self.locked():
+            entries = self.load().get(self.key, list())
+        return [item for item in entries if spec in [None, item['spec']]]
+
+    def update(self, function):
+        """Update the pooled vms.
+
+        :param function: called with the pooled vms list to update in place
+        :return: function result
+        """
+        with self.locked():
+            content = self.load()
+            entries = content.setdefault(self.key, list())
+            result = function(entries)
+            file_mgmt('w', self.filename, content)
+        return result
+
+    def add(self, res, spec):
+        """Add a ready vm to the pool.
+
+        :param res: pooled windows resource
+        :param spec: pool identifier
+        """
+        entry = deepcopy(res)
+        entry['spec'] = spec
+        entry.pop(ADMINISTRADOR_PWD, None)
+        self.update(lambda entries: entries.append(entry))
+
+    def remove(self, name):
+        """Remove a vm from the pool.
+
+        :param name: pooled vm name
+        """
+        def remove(entries):
+            entries[:] = [item for item in entries if item['name'] != name]
+        self.update(remove)
+
+    def prune(self, nodes):
+        """Forget pooled vms which no longer exist.
+
+        :param nodes: libcloud nodes indexed by vm name
+        """
+        def prune(entries):
+            entries[:] = [item for item in entries if item['name'] in nodes]
+        self.update(prune)
+
+    def claim(self, res):
+        """Claim a pooled vm matching the resource settings.
+
+        :param res: windows resource
+        :return: pooled windows resource or None
+        """
+        spec = self.spec(res)
+
+        def claim(entries):
+            for index, item in enumerate(entries):
+                if item['spec'] == spec:
+                    return entries.pop(index)
+        return self.update(claim)
+
 
 class LibCloud(LoggerMixin):
     """Apache LibCloud OpenStack provider implementation."""
 
     security.VERIFY_SSL_CERT = False
 
-    def __init__(self, credentials):
+    def __init__(self, credentials, catalog_file=None,
+                 floating_ips_file=None, pool_file=None):
         """Constructor.
 
         :param credentials: provider credentials
+        :param catalog_file: file to save the catalog listings to
+        :param floating_ips_file: file tracking the reserved floating ips
+        :param pool_file: file tracking the pooled vms
         """
         self.driver = get_driver(Provider.OPENSTACK)(
             credentials['os_username'],
@@ -72,76 +561,72 @@ class LibCloud(LoggerMixin):
         except (ConnectionError, InvalidCredsError):
             raise ProvisionError('Connection to OpenStack provider failed.')
 
+        # vms state poller shared by all vms building
+        self.poller = NodeStatePoller(self.driver)
+
+        # key identifying the cloud in files shared by clouds
+        cloud = '%s:%s:%s' % (credentials['os_auth_url'],
+                              credentials['os_project_name'],
+                              credentials.get('os_region', 'regionOne'))
+
+        # images, flavors, key pairs and networks listings
+        self.catalog = Catalog(
+            self.driver,
+            filename=catalog_file,
+            ttl=credentials.get('catalog_ttl', 0),
+            key=cloud
+        )
+
+        # floating ips kept allocated between provisions
+        self.reservations = FloatingIpReservations(
+            filename=floating_ips_file,
+            size=credentials.get('reserved_floating_ips', 0),
+            key=cloud
+        )
+
+        # vms booted ahead of time
+        self.warm_pool = WarmPool(pool_file, key=cloud) if pool_file \
+            else None
+
     def get_image(self, name):
         """Get the LibCloud image object.
 
         :param name: image name or id
         """
-        images = self.driver.list_images()
-
-        by_name = list(filter(lambda elm: elm.name == name, images))
-        by_id = list(filter(lambda elm: elm.id == name, images))
-
-        if by_name.__len__() != 0:
-            return by_name[0]
-        elif by_id.__len__() != 0:
-            return by_id[0]
-        else:
+        image = self.catalog.get('images', name)
+        if image is None:
             raise NotFound('Not found image: %s.' % name)
+        return image
 
     def get_flavor(self, name):
         """Get the LibCloud size 'flavor' object.
 
         :param name: flavor name or id
         """
-        sizes = self.driver.list_sizes()
-
-        by_name = list(filter(lambda elm: elm.name == name, sizes))
-        by_id = list()
-
-        for size in sizes:
-            try:
-                if name == int(size.id):
-                    by_id.append(size)
-                    break
-            except ValueError:
-                # base 10
-                continue
-
-        if by_name.__len__() != 0:
-            return by_name[0]
-        elif by_id.__len__() != 0:
-            return by_id[0]
-        else:
+        flavor = self.catalog.get('flavors', name)
+        if flavor is None:
             raise NotFound('Not found flavor: %s.' % name)
+        return flavor
 
     def get_key_pair(self, name):
         """Get the LibCloud key pair object.
 
         :param name: key pair name
         """
-        pairs = self.driver.list_key_pairs()
-
-        data = list(filter(lambda elm: elm.name == name, pairs))
-
-        if data.__len__() == 0:
+        key_pair = self.catalog.get('key_pairs', name)
+        if key_pair is None:
             raise NotFound('Not found key pair: %s.' % name)
-        else:
-            return data[0]
+        return key_pair
 
     def get_float_ip_pool(self, name):
         """Get the LibCloud floating ip pool object.
 
         :param name: floating ip pool name
         """
-        pool = self.driver.ex_list_floating_ip_pools()
-
-        data = list(filter(lambda elm: elm.name == name, pool))
-
-        if data.__len__() == 0:
+        pool = self.catalog.get('floating_ip_pools', name)
+        if pool is None:
             raise NotFound('Not found floating ip pool: %s.' % name)
-        else:
-            return data[0]
+        return pool
 
     def get_node(self, name):
         """Get the LibCloud node object.
@@ -157,6 +642,17 @@ class LibCloud(LoggerMixin):
         else:
             return data[0]
 
+    def get_nodes(self):
+        """Get all LibCloud node objects with a single listing.
+
+        :return: nodes indexed by vm name
+        :rtype: dict
+        """
+        nodes = dict()
+        for node in self.driver.list_nodes():
+            nodes.setdefault(node.name, node)
+        return nodes
+
     def boot_vm(self, name, image, flavor, key_pair, network=None):
         """Boot a virtual machine.
 
@@ -200,12 +696,15 @@ class LibCloud(LoggerMixin):
     def wait_for_building_finish(self, node, res):
         """Wait for a vm to finish building.
 
+        Each provision attempt gives the vm BUILD_ATTEMPT_TIME seconds to
+        finish building, the vm state is checked by the shared poller.
+
         :param node: libcloud node object
         :param res: resource definition
+        :return: up to date libcloud node object
         """
         self.logger.info('Wait for vm %s to finish building.', node.name)
 
-        attempt = 1
         max_attempts = 30
 
         # check if resource requested to override the default max attempts
@@ -218,24 +717,9 @@ class LibCloud(LoggerMixin):
             elif provision_attempts > 0:
                 max_attempts = provision_attempts
 
-        while attempt <= max_attempts:
-            node = self.driver.ex_get_node_details(node.id)
-            state = getattr(node, 'state')
-            msg = '%s:%s. VM %s, STATE=%s' % (attempt, max_attempts,
-                                              node.name, state)
-
-            if state.lower() != 'running':
-                self.logger.info('%s, rechecking in 20 seconds.', msg)
-                with spinner():
-                    sleep(20)
-            else:
-                self.logger.info(msg)
-                self.logger.info('VM %s successfully finished building!',
-                                 node.name)
-                return node
-            attempt += 1
-
-        raise BuildError('VM %s was unable to finish building.' % node.name)
+        node = self.poller.wait(node, max_attempts * BUILD_ATTEMPT_TIME)
+        self.logger.info('VM %s successfully finished building!', node.name)
+        return node
 
     def attach_floating_ip(self, node, network):
         """Attach floating IP to vm.
@@ -243,9 +727,31 @@ class LibCloud(LoggerMixin):
         :param node: libcloud node object
         :param network: external network address
         """
-        try:
-            self.logger.info('Attach floating ip to vm %s.', node.name)
+        self.logger.info('Attach floating ip to vm %s.', node.name)
+
+        # use a reserved floating ip when available
+        ip_obj = self.reservations.take(network.name)
+        if ip_obj is not None:
+            try:
+                if self.driver.ex_attach_floating_ip_to_node(
+                        node, ip_obj) is not False:
+                    self.logger.info('VM %s FIP %s (reserved).', node.name,
+                                     ip_obj.ip_address)
+                    return str(ip_obj.ip_address)
+            except Exception as ex:
+                self.logger.debug(ex)
+            self.logger.warning('Reserved floating ip %s is unavailable.',
+                                ip_obj.ip_address)
+
+            # no longer reserved, release it instead of leaking it
+            try:
+                self.driver.ex_delete_floating_ip(ip_obj)
+            except Exception as ex:
+                self.logger.warning('Unable to release floating ip %s: %s',
+                                    ip_obj.ip_address,
+                                    getattr(ex, 'message', ex))
 
+        try:
             ip_obj = network.create_floating_ip()
 
             self.logger.info('VM %s FIP %s.', node.name, ip_obj.ip_address)
@@ -274,14 +780,10 @@ class LibCloud(LoggerMixin):
 
         :param name: network name
         """
-        networks = self.driver.ex_list_networks()
-
-        data = list(filter(lambda elm: elm.name == name, networks))
-
-        if data.__len__() == 0:
+        network = self.catalog.get('networks', name)
+        if network is None:
             raise NotFound('Not found network: %s.' % name)
-        else:
-            return data[0]
+        return network
 
 
 class OpenStack(LibCloud):
@@ -304,7 +806,12 @@ class OpenStack(LibCloud):
         # set resources
         self.set_resources(args.resources)
 
-        super(OpenStack, self).__init__(self.credentials)
+        super(OpenStack, self).__init__(
+            self.credentials,
+            catalog_file=join(self.user_dir, OPENSTACK_CATALOG),
+            floating_ips_file=join(self.user_dir, OPENSTACK_FLOATING_IPS),
+            pool_file=join(self.user_dir, OPENSTACK_POOL)
+        )
 
     @property
     def name(self):
@@ -400,118 +907,354 @@ class OpenStack(LibCloud):
                     auth[key.lower()] = getenv(key)
                     if auth[key.lower()] is None:
                         raise NotFound('Env variable: %s is not found.' % key)
+
+        # optional settings, only available when set by file
+        for key, default in OPENSTACK_OPTIONS.items():
+            auth[key] = default
+            if value and value.get(key) is not None:
+                auth[key] = value[key]
+
         self._credentials = auth
 
     def garbage_collector(self):
         """Garbage collector."""
         return [self.resources_paws_file]
 
-    def provision(self):
-        """Provision OpenStack resources."""
-        for res in self.resources:
-            node = None
+    def get_resource_objects(self, res, nodes):
+        """Get the libcloud objects required to provision a resource.
 
+        :param res: windows resource
+        :param nodes: existing libcloud nodes indexed by vm name
+        :return: resource with its libcloud image, flavor and networks
+        :rtype: dict
+        """
+        if res['name'] in nodes:
+            raise ProvisionError(
+                'Resource %s exits. Skipping provision!' % res['name']
+            )
+        self.logger.debug('Resource %s does not exist. Lets provision!',
+                          res['name'])
+
+        # lets handle getting libcloud objects
+        int_net = None
+        if 'network' in res and 'floating_ip_pools' in res:
+            # more than one internal network
+            # network=internal & floating_ip_pools=external
             try:
-                self.get_node(res['name'])
-                raise ProvisionError(
-                    'Resource %s exits. Skipping provision!' % res['name']
-                )
-            except NotFound:
-                self.logger.debug('Resource %s does not exist. Lets '
-                                  'provision!', res['name'])
-
-            # lets handle getting libcloud objects
-            ext_net = res['network']
-            int_net = None
-            if 'network' in res and 'floating_ip_pools' in res:
-                # more than one internal network
-                # network=internal & floating_ip_pools=external
-                try:
-                    int_net = self.get_network(res['network'])
-                    ext_net = self.get_float_ip_pool(res['floating_ip_pools'])
-                except NotFound as ex:
-                    raise ProvisionError(ex.message + ' for %s.' % res['name'])
-            else:
-                try:
-                    ext_net = self.get_float_ip_pool(res['network'])
-                except NotFound as ex:
-                    raise ProvisionError(ex.message + ' for %s.' % res['name'])
-
+                int_net = self.get_network(res['network'])
+                ext_net = self.get_float_ip_pool(res['floating_ip_pools'])
+            except NotFound as ex:
+                raise ProvisionError(ex.message + ' for %s.' % res['name'])
+        else:
             try:
-                image = self.get_image(res['image'])
-                flavor = self.get_flavor(res['flavor'])
-                self.get_key_pair(res['keypair'])
+                ext_net = self.get_float_ip_pool(res['network'])
             except NotFound as ex:
                 raise ProvisionError(ex.message + ' for %s.' % res['name'])
 
-            try:
-                # boot vm
-                node = self.boot_vm(res['name'], image, flavor, res['keypair'],
-                                    network=int_net)
-
-                # wait for vm to finish building
-                self.wait_for_building_finish(node, res)
-
-                # create/attach floating ip
-                res['public_v4'] = self.attach_floating_ip(node, ext_net)
-            except BootError as ex:
-                raise ProvisionError(ex.message)
-            except (BuildError, NetworkError, SSHError) as ex:
-                self.logger.error(ex.message)
-                self.logger.info('Tearing down vm: %s.', res['name'])
-                self.driver.destroy_node(node)
-                raise ProvisionError('Provision task failed.')
-
-        # set administrator password
-        self.resources = set_administrator_password(
-            self.resources,
-            self.user_dir
-        )
+        try:
+            image = self.get_image(res['image'])
+            flavor = self.get_flavor(res['flavor'])
+            self.get_key_pair(res['keypair'])
+        except NotFound as ex:
+            raise ProvisionError(ex.message + ' for %s.' % res['name'])
+
+        return dict(res=res, image=image, flavor=flavor, int_net=int_net,
+                    ext_net=ext_net)
+
+    def create_resource(self, objects):
+        """Boot a vm, wait for it to finish building and attach its floating
+        ip.
+
+        When the vm fails to build or to get its floating ip, only this vm is
+        torn down.
+
+        :param objects: resource with its libcloud objects
+        :type objects: dict
+        """
+        res = objects['res']
+        node = None
+
+        try:
+            # boot vm
+            node = self.boot_vm(res['name'], objects['image'],
+                                objects['flavor'], res['keypair'],
+                                network=objects['int_net'])
+
+            # wait for vm to finish building
+            node = self.wait_for_building_finish(node, res)
+
+            # create/attach floating ip
+            res['public_v4'] = self.attach_floating_ip(
+                node, objects['ext_net'])
+        except BootError as ex:
+            raise ProvisionError(ex.message)
+        except (BuildError, NetworkError, SSHError) as ex:
+            self.logger.error(ex.message)
+            self.logger.info('Tearing down vm: %s.', res['name'])
+            self.driver.destroy_node(node)
+            raise ProvisionError('Provision failed for vm: %s.' % res['name'])
+
+        return node
+
+    def create_pooled_resource(self, objects):
+        """Boot a vm for a pool, set its administrator password and add it
+        to the pool.
+
+        Each vm is added to the pool as soon as it is ready. A vm whose
+        administrator password could not be set is deleted.
+
+        :param objects: resource with its libcloud objects and pool id
+        :type objects: dict
+        """
+        res = objects['res']
+        node = self.create_resource(objects)
 
-        # create inventory file
-        resources_paws = dict(resources=self.resources)
-        create_inventory(
-            PlayCall(self.user_dir).inventory_file,
-            resources_paws
+        try:
+            set_administrator_password([res], self.user_dir)
+        except SSHError:
+            self.logger.info('Tearing down vm: %s.', res['name'])
+            res = deepcopy(res)
+            res.pop('snapshot', None)
+            self.delete_resource(res, node, dict())
+            raise ProvisionError('Pool failed for vm: %s.' % res['name'])
+
+        self.warm_pool.add(res, objects['spec'])
+
+    def provision(self):
+        """Provision OpenStack resources.
+
+        All resources are booted concurrently, the number of vms handled at
+        the same time is limited by the max_workers credentials setting.
+        """
+        nodes = self.get_nodes()
+
+        # fail before claiming or booting any vm when a resource cannot be
+        # provisioned
+        validated = [self.get_resource_objects(res, nodes)
+                     for res in self.resources]
+
+        claimed, objects = list(), list()
+        for item in validated:
+            if self.claim_pooled_vm(item['res'], nodes):
+                claimed.append(item['res'])
+                continue
+            objects.append(item)
+
+        results = concurrent_map(
+            self.create_resource,
+            objects,
+            self.credentials['max_workers']
         )
 
+        provisioned, failed = claimed, list()
+        for item, (_, error) in zip(objects, results):
+            if error is None:
+                provisioned.append(item['res'])
+                continue
+            self.logger.error(getattr(error, 'message', error))
+            failed.append(item['res']['name'])
+        names = [res['name'] for res in provisioned]
+        self.resources = [res for res in self.resources if res['name'] in names]
+
+        if self.resources:
+            # set administrator password
+            self.resources = set_administrator_password(
+                self.resources,
+                self.user_dir
+            )
+
         # create resources.paws
         resources_paws = dict(resources=deepcopy(self.resources))
-        file_mgmt('w', self.resources_paws_file, resources_paws)
+        write_resources_paws(self.resources_paws_file, resources_paws,
+                             self.name)
+
+        if failed:
+            raise ProvisionError(
+                'Provision task failed for vm(s): %s.' % ', '.join(failed))
 
         return resources_paws
 
-    def teardown(self):
-        """Teardown OpenStack resources."""
-        for index, res in enumerate(self.resources):
-            self.logger.info('Deleting vm %s.', res['name'])
+    def claim_pooled_vm(self, res, nodes):
+        """Claim a ready vm from the pool for a resource.
 
-            try:
-                node = self.get_node(res['name'])
-            except NotFound as ex:
-                self.logger.warning(ex.message + ' Skipping teardown.')
-                self.resources.pop(index)
+        The claimed vm is renamed to the resource name. Only resources
+        declaring a pool_size claim pooled vms. When the vm cannot be
+        renamed it goes back to the pool and the resource is booted instead.
+
+        :param res: windows resource
+        :param nodes: existing libcloud nodes indexed by vm name
+        :return: whether a pooled vm was claimed
+        :rtype: bool
+        """
+        if not res.get('pool_size') or self.warm_pool is None or \
+                res['name'] in nodes:
+            return False
+
+        while True:
+            entry = self.warm_pool.claim(res)
+            if entry is None:
+                return False
+            if entry['name'] in nodes:
+                break
+            self.logger.warning('Pooled vm %s no longer exists.',
+                                entry['name'])
+
+        try:
+            self.driver.ex_update_node(nodes[entry['name']], name=res['name'])
+        except Exception as ex:
+            self.logger.warning('Unable to claim pooled vm %s: %s.',
+                                entry['name'], ex)
+            self.warm_pool.add(entry, entry['spec'])
+            return False
+
+        res['public_v4'] = entry['public_v4']
+        res['win_username'] = entry['win_username']
+        res['win_password'] = entry['win_password']
+        res.pop(ADMINISTRADOR_PWD, None)
+
+        self.logger.info('Claimed pooled vm %s for vm %s.', entry['name'],
+                         res['name'])
+        return True
+
+    def pool(self):
+        """Fill the pools of ready OpenStack vms.
+
+        Each resource declaring a pool_size gets that many vms booted ahead
+        of time with their administrator password set. Pooled vms above the
+        pool size are deleted.
+        """
+        nodes = self.get_nodes()
+
+        # pooled vms wanted per pool, the first resource is the template
+        pools = dict()
+        for res in self.resources:
+            if not res.get('pool_size'):
                 continue
+            size, template = pools.get(self.warm_pool.spec(res), (0, res))
+            pools[self.warm_pool.spec(res)] = \
+                (max(size, int(res['pool_size'])), template)
+
+        # forget pooled vms deleted outside of paws
+        self.warm_pool.prune(nodes)
+
+        objects, extra = list(), list()
+        for spec, (size, template) in pools.items():
+            pooled = self.warm_pool.entries(spec)
+            extra.extend(pooled[size:])
+
+            for _ in range(size - len(pooled)):
+                res = deepcopy(template)
+                res['name'] = 'paws_pool_%s' % str(uuid4())[:8]
+                objects.append(self.get_resource_objects(res, nodes))
+                objects[-1]['spec'] = spec
+
+        if extra:
+            floating_ips = dict(
+                (fip.ip_address, fip) for fip in
+                self.driver.ex_list_floating_ips())
+            for res in extra:
+                self.delete_resource(res, nodes[res['name']], floating_ips)
+                self.warm_pool.remove(res['name'])
+
+        results = concurrent_map(
+            self.create_pooled_resource,
+            objects,
+            self.credentials['max_workers']
+        )
 
-            try:
-                # create snapshot
-                res['public_v4'] = self.get_floating_ip(node)
-                self.take_snapshot(res)
+        failed = list()
+        for item, (_, error) in zip(objects, results):
+            if error is not None:
+                self.logger.error(getattr(error, 'message', error))
+                failed.append(item['res']['name'])
 
-                # detach the floating ip from vm
-                fip = self.get_floating_ip(node)
+        if failed:
+            raise ProvisionError(
+                'Pool task failed for vm(s): %s.' % ', '.join(failed))
 
-                if fip is not None:
-                    fip_obj = self.driver.ex_get_floating_ip(fip)
-                    self.driver.ex_detach_floating_ip_from_node(node, fip_obj)
-                    self.driver.ex_delete_floating_ip(fip_obj)
+        return dict(resources=self.warm_pool.entries())
 
-                # delete the vm
-                self.driver.destroy_node(node)
+    def delete_resource(self, res, node, floating_ips):
+        """Delete a vm and its floating ip.
 
-                self.logger.info('Successfully deleted vm %s!', res['name'])
-            except Exception as ex:
-                raise TeardownError(ex.message)
+        :param res: windows resource
+        :param node: libcloud node object
+        :param floating_ips: libcloud floating ip objects indexed by address
+        """
+        self.logger.info('Deleting vm %s.', res['name'])
+
+        # create snapshot
+        res['public_v4'] = self.get_floating_ip(node)
+        self.take_snapshot(res)
+
+        # detach the floating ip from vm
+        fip = res['public_v4']
+
+        if fip is not None:
+            fip_obj = floating_ips.get(fip) or \
+                self.driver.ex_get_floating_ip(fip)
+            self.driver.ex_detach_floating_ip_from_node(node, fip_obj)
+
+            # keep the floating ip for the next provision when reserving
+            kept = False
+            if self.reservations.enabled:
+                pool = res.get('floating_ip_pools', res['network'])
+                try:
+                    pool = self.get_float_ip_pool(pool).name
+                except NotFound:
+                    pass
+                kept = self.reservations.give_back(pool, fip_obj)
+
+            if not kept:
+                self.driver.ex_delete_floating_ip(fip_obj)
+
+        # delete the vm
+        self.driver.destroy_node(node)
+
+        self.logger.info('Successfully deleted vm %s!', res['name'])
+
+    def teardown(self):
+        """Teardown OpenStack resources.
+
+        VMs are looked up with a single listing and deleted concurrently, the
+        number of vms handled at the same time is limited by the max_workers
+        credentials setting.
+        """
+        nodes = self.get_nodes()
+
+        resources = list()
+        for res in self.resources:
+            if res['name'] not in nodes:
+                self.logger.warning('Not found vm: %s. Skipping teardown.',
+                                    res['name'])
+                continue
+            resources.append(res)
+
+        floating_ips = dict()
+        if resources:
+            for fip in self.driver.ex_list_floating_ips():
+                floating_ips[fip.ip_address] = fip
+
+        results = concurrent_map(
+            lambda res: self.delete_resource(
+                res, nodes[res['name']], floating_ips),
+            resources,
+            self.credentials['max_workers']
+        )
+
+        deleted, failed = list(), list()
+        for res, (_, error) in zip(resources, results):
+            if error is None:
+                deleted.append(res)
+                continue
+            self.logger.error('Failed to delete vm %s: %s', res['name'],
+                              getattr(error, 'message', error))
+            failed.append(res['name'])
+        self.resources = deleted
+
+        if failed:
+            raise TeardownError(
+                'Teardown task failed for vm(s): %s.' % ', '.join(failed))
 
         resources_paws = dict(resources=deepcopy(self.resources))
         return resources_paws
@@ -537,7 +1280,8 @@ class OpenStack(LibCloud):
 
         # create resources.paws
         resources_paws = dict(resources=deepcopy(resources))
-        file_mgmt('w', self.resources_paws_file, resources_paws)
+        write_resources_paws(self.resources_paws_file, resources_paws,
+                             self.name)
 
         return resources_paws
 
@@ -15,11 +15,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-"""Paws tasks package."""
+"""Paws tasks package.
 
-from paws.tasks.action import Provision, Teardown, Show
-from paws.tasks.configure import Configure
-from paws.tasks.group import Group
-from paws.tasks.winsetup import Winsetup
+Task classes are imported on first access (python >= 3.7) so running one task
+does not import the dependencies (ansible, ..) of all the others.
+"""
 
-__all__ = ['Group', 'Provision', 'Teardown', 'Show', 'Winsetup', 'Configure']
+import sys
+from importlib import import_module
+
+__all__ = ['Group', 'Pool', 'Provision', 'Teardown', 'Show', 'Winsetup',
+           'Configure']
+
+# task class name mapped to the module defining it
+_TASK_MODULES = {
+    'Group': 'paws.tasks.group',
+    'Pool': 'paws.tasks.action',
+    'Provision': 'paws.tasks.action',
+    'Teardown': 'paws.tasks.action',
+    'Show': 'paws.tasks.action',
+    'Winsetup': 'paws.tasks.winsetup',
+    'Configure': 'paws.tasks.configure'
+}
+
+
+def __getattr__(name):
+    """Import a task class on first access."""
+    if name not in _TASK_MODULES:
+        raise AttributeError('module %s has no attribute %s' %
+                             (__name__, name))
+    return getattr(import_module(_TASK_MODULES[name]), name)
+
+
+if sys.version_info < (3, 7):
+    # no module level __getattr__ support, import all tasks
+    for _name in __all__:
+        globals()[_name] = __getattr__(_name)
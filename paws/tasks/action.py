@@ -191,3 +191,38 @@ class Show(Action):
         """
         super(Show, self).__init__(
             user_dir, resources, credentials, verbose=verbose, **kwargs)
+
+
+class Pool(Action):
+    """Paws pool task.
+
+    This class will handle filling the pools of ready windows resources in
+    their defined provider. Provision claims resources from these pools.
+    """
+
+    def __init__(self, user_dir, resources, credentials, verbose=0, **kwargs):
+        """Constructor.
+
+        Usage:
+
+            -- CLI --
+
+        .. code-block: bash
+
+            $ paws <options> pool <options>
+
+            -- API --
+
+        .. code-block: python
+
+            from paws.tasks import Pool
+
+            pool = Pool(
+                user_dir,
+                resources,
+                credentials
+            )
+            pool.run()
+        """
+        super(Pool, self).__init__(
+            user_dir, resources, credentials, verbose=verbose, **kwargs)
@@ -24,16 +24,20 @@ paws source code in the future.
 """
 
 import ast
+from time import sleep
 
 import os
 from ansible.errors import AnsibleRuntimeError
 
 from paws.compat import string_types
+from paws.constants import ANSIBLE_RETRY_DELAY, ANSIBLE_TRIES, \
+    DEFAULT_MAX_WORKERS, POWERSHELL_BACKENDS
 from paws.core import Namespace, PawsTask
-from paws.exceptions import SSHError
-from paws.helpers import file_mgmt, get_ssh_conn, cleanup
+from paws.helpers import file_mgmt, wait_for_ssh
 from paws.lib.remote import create_inventory, PlaybookCall, ParsePSResults, \
     ResultsHandler
+from paws.lib.powershell import run_powershell
+from paws.lib.state import read_resources_paws
 from paws.lib.windows import create_ps_exec_playbook
 
 
@@ -45,7 +49,6 @@ class Configure(PawsTask):
     """
 
     script_type = ''
-    extra_vars = dict()
     results_class = None
     res = list()
 
@@ -82,7 +85,9 @@ class Configure(PawsTask):
                 resources,
                 credentials,
                 script='<script>,
-                variables='<variables>'
+                variables='<variables>',
+                serial=False,
+                backend='ansible'
             )
             configure.run()
         """
@@ -91,6 +96,7 @@ class Configure(PawsTask):
         self.credentials = credentials
         self.verbose = verbose
         self.playbook = PlaybookCall(self.userdir)
+        self.extra_vars = dict()
 
         # cache options for later use
         try:
@@ -98,11 +104,20 @@ class Configure(PawsTask):
                 kwargs['args'], 'script'))
             self.script_vars = getattr(kwargs['args'], 'script_vars', None)
             self.systems = getattr(kwargs['args'], 'systems', 'all')
+            self.serial = getattr(kwargs['args'], 'serial', False)
+            self.backend = getattr(kwargs['args'], 'backend', 'ansible')
         except KeyError:
             self.script = os.path.join(self.userdir, getattr(
                 Namespace(kwargs), 'script'))
             self.script_vars = getattr(Namespace(kwargs), 'script_vars', None)
             self.systems = getattr(Namespace(kwargs), 'systems', 'all')
+            self.serial = getattr(Namespace(kwargs), 'serial', False)
+            self.backend = getattr(Namespace(kwargs), 'backend', 'ansible')
+
+        if self.backend not in POWERSHELL_BACKENDS:
+            self.logger.error('Backend %s is not supported, choose from %s.'
+                              % (self.backend, POWERSHELL_BACKENDS))
+            raise SystemExit(1)
 
         # script exist
         if not os.path.exists(self.script):
@@ -110,13 +125,11 @@ class Configure(PawsTask):
             raise SystemExit(1)
 
         # override resources if resources.paws exists
-        if os.path.exists(self.resources_paws_file):
-            self.resources = file_mgmt('r', self.resources_paws_file)
-
-        # clean up prior inventory file
-        cleanup([self.playbook.inventory_file])
+        resources_paws = read_resources_paws(self.resources_paws_file)
+        if resources_paws:
+            self.resources = resources_paws
 
-        # create ansible inventory
+        # create ansible inventory, reused when the resources did not change
         create_inventory(self.playbook.inventory_file, self.resources)
 
         # set the systems under test
@@ -177,6 +190,12 @@ class Configure(PawsTask):
             # variables undefined
             vtype = self.script_vars
 
+        self.script_vars_type = vtype
+
+        # persistent winrm sessions run the script without a playbook
+        if self.backend == 'winrm':
+            return
+
         # create ansible playbook to run powershell script
         self.script = create_ps_exec_playbook(self.userdir, vtype)
 
@@ -221,6 +240,79 @@ class Configure(PawsTask):
                               (self.resources, _active))
             raise SystemExit(1)
 
+    def run_winrm(self, systems):
+        """Run the PowerShell script over persistent WinRM sessions.
+
+        :param systems: Systems with host, username and password keys
+        :type systems: list
+        """
+        if not systems:
+            return
+
+        results = run_powershell(
+            systems,
+            self.script,
+            self.extra_vars.get('psv'),
+            self.script_vars_type,
+            max_workers=1 if self.serial else DEFAULT_MAX_WORKERS
+        )
+
+        try:
+            self.results_class(
+                int(not all(item['success'] for item in results)),
+                Namespace(dict(contacted=results, unreachable=False)),
+                self.default_callback
+            ).process()
+        except AnsibleRuntimeError:
+            self.exit_code = 1
+
+    def run_playbook(self, hosts):
+        """Run the playbook against the systems.
+
+        The playbook runs once against all systems, letting ansible forks
+        configure them in parallel, or once per system when serial. When it
+        fails, it runs again only against the systems which failed or were
+        not reached, systems already configured are left alone.
+
+        :param hosts: Systems IP addresses
+        :type hosts: list
+        """
+        if self.serial:
+            batches = [[host] for host in hosts]
+        else:
+            batches = [hosts]
+
+        for batch in batches:
+            for attempt in range(1, ANSIBLE_TRIES + 1):
+                self.extra_vars['hosts'] = ','.join(batch)
+
+                try:
+                    self.playbook.run_once(
+                        self.script,
+                        self.extra_vars,
+                        results_class=self.results_class,
+                        default_callback=self.default_callback
+                    )
+                    break
+                except SystemExit:
+                    self.exit_code = 1
+                    break
+                except AnsibleRuntimeError:
+                    if attempt == ANSIBLE_TRIES:
+                        self.exit_code = 1
+                        break
+
+                retry = self.playbook.failed_hosts | \
+                    (set(batch) - self.playbook.processed_hosts)
+                batch = [host for host in batch if host in retry]
+                if not batch:
+                    self.exit_code = 1
+                    break
+                self.logger.warning(
+                    'Playbook failed on %s, retrying in %d seconds.' %
+                    (', '.join(batch), ANSIBLE_RETRY_DELAY))
+                sleep(ANSIBLE_RETRY_DELAY)
+
     def run(self):
         """Configure Windows services on supplied systems.
 
@@ -229,36 +321,39 @@ class Configure(PawsTask):
         """
         self.start()
 
+        systems = list()
         for res in self.res:
             try:
                 # cloud providers
                 host = res['public_v4']
             except KeyError:
                 host = res['ip']
-
-            self.extra_vars['hosts'] = host
-
-            try:
-                self.logger.info('Attempting to establish SSH connection '
-                                 'to %s.' % host)
-                get_ssh_conn(host, res['win_username'],
-                             res['win_password'])
-
-                self.playbook.run(
-                    self.script,
-                    self.extra_vars,
-                    results_class=self.results_class,
-                    default_callback=self.default_callback
-                )
-            except SSHError:
+            systems.append(dict(host=host, username=res['win_username'],
+                                password=res['win_password']))
+
+        # wait for all systems to accept ssh connections at once
+        self.logger.info('Attempting to establish SSH connection to %s.' %
+                         ', '.join(system['host'] for system in systems))
+        ready = wait_for_ssh(systems)
+
+        hosts = list()
+        for system in systems:
+            if ready[system['host']]:
+                hosts.append(system['host'])
+            else:
                 self.exit_code = 1
                 self.logger.error('Unable to establish SSH connection to '
-                                  '%s.' % host)
-            except (AnsibleRuntimeError, SystemExit):
-                self.exit_code = 1
-            finally:
-                self.end()
+                                  '%s.' % system['host'])
+
+        if self.script_type == 'Windows PowerShell' and \
+                self.backend == 'winrm':
+            self.run_winrm([system for system in systems
+                            if system['host'] in hosts])
+        elif hosts:
+            self.run_playbook(hosts)
+
+        self.end()
+        self.logger.info('END: %s, TIME: %dh:%dm:%ds' % (
+            self.name, self.hours, self.minutes, self.seconds))
 
-                self.logger.info('END: %s, TIME: %dh:%dm:%ds' % (
-                    self.name, self.hours, self.minutes, self.seconds))
         return self.exit_code
@@ -18,16 +18,21 @@
 
 """Group task."""
 
+from contextlib import contextmanager
+from hashlib import sha1
+from json import dumps
 from time import sleep
 
 import re
 from importlib import import_module
-from os.path import join
+from os.path import exists, isfile, join
 
+from paws.compat import Queue, string_types
 from paws.constants import GROUP_SECTIONS, GROUP_SCHEMA, TASK_ARGS, \
-    GROUP_HELP, GROUP_REQUIRED
+    GROUP_HELP, GROUP_REQUIRED, DEFAULT_MAX_WORKERS, GROUP_CHECKPOINT
 from paws.core import PawsTask, Namespace
-from paws.helpers import check_file, file_mgmt, get_task_module_path
+from paws.helpers import ANSIBLE_LOCK, FILE_CACHE, RESOURCES_LOCK, \
+    check_file, file_mgmt, get_task_module_path
 
 
 class Group(PawsTask):
@@ -39,7 +44,11 @@ class Group(PawsTask):
     workflow with other folks.
 
     Groups eliminate the need to run multiple individual paws commands by
-    combining them into one pipeline of tasks.
+    combining them into one pipeline of tasks. Tasks run in order unless they
+    declare the tasks they need, independent tasks then run concurrently.
+
+    Completed tasks are recorded in a checkpoint file, a resumed run skips
+    the tasks completed with unchanged inputs.
     """
 
     _header_name = GROUP_SECTIONS[0]
@@ -92,6 +101,10 @@ class Group(PawsTask):
         self.vars_pos = 0
         self.tasks_pos = 0
         self.tasklist = []
+        self.needs = []
+        self.keys = []
+        self.checkpoint_file = join(self.userdir, GROUP_CHECKPOINT)
+        self.checkpoint = dict()
 
     def pre_run(self):
         """Perform any necessary pre task actions."""
@@ -100,6 +113,18 @@ class Group(PawsTask):
 
         # Update task list
         self.tasklist = self.groupdata['tasks']
+        self.needs = self.dependencies()
+
+        # Identify tasks by name, numbering repeated names
+        self.keys = []
+        for item in self.tasklist:
+            count = sum(1 for item_ in self.tasklist[:len(self.keys)]
+                        if item_['name'] == item['name'])
+            self.keys.append(
+                '%s (%d)' % (item['name'], count) if count else item['name'])
+
+        # Load the completed tasks when resuming
+        self.checkpoint = self.load_checkpoint()
 
         # Set common arguments used by all tasks in memory
         self.set_task_attr(
@@ -226,18 +251,159 @@ in %s %s. Expected .yaml or .yml" % (_rule, krnd, key))
         for key in args:
             delattr(self.args, key)
 
-    def run(self):
-        """The main method for group. This method will run a ordered list of
-        paws tasks."""
-        # pre run tasks
-        self.pre_run()
+    def dependencies(self):
+        """Return the tasks each task needs, by task position.
 
-        self.logger.info("START: %s", self.name)
+        A task declaring needs (a task name or a list of task names) starts
+        once those tasks succeeded, an empty list lets it start right away. A
+        task without needs runs after the task declared before it, so a
+        group without needs runs its tasks in order.
 
-        # save the start time
-        self.start()
+        :return: positions of the tasks needed, for each task
+        :rtype: list
+        """
+        _help = "Please refer to %s to setup your group file" % GROUP_HELP
 
-        for item in self.tasklist:
+        positions = dict()
+        for pos, item in enumerate(self.tasklist):
+            positions.setdefault(item['name'], pos)
+
+        needs = list()
+        for pos, item in enumerate(self.tasklist):
+            if 'needs' not in item:
+                needs.append(set([pos - 1]) if pos else set())
+                continue
+
+            names = item['needs'] or []
+            if isinstance(names, string_types):
+                names = [names]
+
+            for name in names:
+                if name not in positions:
+                    self.logger.error("Task %s needs undefined task %s" %
+                                      (item['name'], name))
+                    self.logger.error(_help)
+                    raise SystemExit(1)
+            needs.append(set(positions[name] for name in names))
+
+        # make sure every task can run, i.e. needs have no cycles
+        done = set()
+        while len(done) < len(needs):
+            ready = [pos for pos, need in enumerate(needs)
+                     if pos not in done and need <= done]
+            if not ready:
+                self.logger.error(
+                    "Task needs form a cycle between: %s" %
+                    ', '.join(self.tasklist[pos]['name']
+                              for pos in range(len(needs)) if pos not in done))
+                self.logger.error(_help)
+                raise SystemExit(1)
+            done.update(ready)
+
+        return needs
+
+    def load_checkpoint(self):
+        """Return the checkpoint to start from.
+
+        When resuming, it is the checkpoint saved by the previous run of the
+        same group, otherwise an empty checkpoint.
+
+        :return: checkpoint
+        :rtype: dict
+        """
+        checkpoint = dict(group=self.args.name, tasks=dict())
+
+        if not getattr(self.args, 'resume', False):
+            return checkpoint
+
+        if not exists(self.checkpoint_file):
+            self.logger.warning("No checkpoint found, running all tasks.")
+            return checkpoint
+
+        saved = file_mgmt('r', self.checkpoint_file)
+        if saved.get('group') != self.args.name:
+            self.logger.warning("Checkpoint is for group %s, running all "
+                                "tasks." % saved.get('group'))
+            return checkpoint
+
+        return saved
+
+    def save_checkpoint(self):
+        """Save the checkpoint in the user directory."""
+        file_mgmt('w', self.checkpoint_file, self.checkpoint)
+
+    def task_digest(self, pos):
+        """Return the digest of a task inputs.
+
+        Inputs are the task definition, the group vars and the content of the
+        files referenced by both (topology, credentials, scripts, ..).
+
+        :param pos: task position
+        :type pos: int
+        :return: digest
+        :rtype: str
+        """
+        item = self.tasklist[pos]
+        values = list(self.groupdata['vars'].values())
+        for arg in item.get('args', []):
+            values.extend(arg.values())
+
+        digest = sha1(dumps(
+            dict(task=item, vars=self.groupdata['vars']),
+            sort_keys=True, default=str).encode('utf-8'))
+
+        for value in values:
+            if not isinstance(value, string_types):
+                continue
+            file_path = join(self.userdir, value)
+            if isfile(file_path):
+                with open(file_path, 'rb') as f_raw:
+                    digest.update(f_raw.read())
+
+        return digest.hexdigest()
+
+    @staticmethod
+    @contextmanager
+    def task_lock(task, task_args):
+        """Hold the locks a task needs while it runs.
+
+        Provision, show and teardown tasks rewrite resources.paws and the
+        inventory, they run alone. The other tasks read them and run
+        concurrently, except configure and winsetup tasks driving ansible
+        which also hold the ansible lock. Configure tasks running PowerShell
+        scripts over WinRM do not.
+
+        :param task: task name
+        :type task: str
+        :param task_args: task arguments
+        :type task_args: Namespace
+        """
+        if task in ['provision', 'show', 'teardown']:
+            with RESOURCES_LOCK.exclusive():
+                yield
+            return
+
+        with RESOURCES_LOCK.shared():
+            if task == 'winsetup' or (task == 'configure' and getattr(
+                    task_args, 'backend', 'ansible') != 'winrm'):
+                with ANSIBLE_LOCK:
+                    yield
+            else:
+                yield
+
+    def run_task(self, pos):
+        """Run a task from the task list.
+
+        Each task runs with its own copy of the group arguments, tasks
+        running at the same time do not see each others arguments.
+
+        :param pos: task position
+        :type pos: int
+        :return: task position and its exit code or the exception raised
+        :rtype: tuple
+        """
+        item = self.tasklist[pos]
+        try:
             task = item['task'].lower()
             self.logger.info("Running: %s (task=%s)" % (item['name'], task))
 
@@ -247,20 +413,21 @@ in %s %s. Expected .yaml or .yml" % (_rule, krnd, key))
                     duration = item['duration']
                     self.logger.info("Delaying %ss" % duration)
                     sleep(int(duration))
-                    continue
                 except KeyError:
                     self.logger.warning(
                         "Delay duration was not set! Skipping.."
                     )
-                    continue
+                return pos, 0
 
+            task_args = Namespace(dict(vars(self.args)))
             if 'args' in item:
                 # combine list of dict into one dict
-                args = {key: value for item in item[
-                    'args'] for key, value in item.items()}
+                args = {key: value for elem in item[
+                    'args'] for key, value in elem.items()}
 
-                # set task specific arguments into memory
-                self.set_task_attr(self.map_task_args(args))
+                # set task specific arguments
+                for key, value in self.map_task_args(args).items():
+                    setattr(task_args, key, value)
 
             # import task module
             pmodule = import_module(get_task_module_path(task))
@@ -268,41 +435,112 @@ in %s %s. Expected .yaml or .yml" % (_rule, krnd, key))
             # get task class
             task_cls = getattr(pmodule, task.title())
 
-            # read files
+            # read files, only parsed again when changed
             _vars = self.groupdata['vars']
             try:
-                credentials = file_mgmt(
-                    'r',
+                credentials = FILE_CACHE.read(
                     join(self.userdir, _vars['credentials'])
                 )
             except (AttributeError, IOError):
                 credentials = None
 
-            resources = file_mgmt(
-                'r',
+            resources = FILE_CACHE.read(
                 join(self.userdir, _vars['topology'])
             )
 
-            # create object from task class
-            task = task_cls(
-                self.userdir,
-                resources,
-                credentials,
-                self.verbose,
-                args=self.args
-            )
+            # provider actions rewrite the files other tasks read and tasks
+            # driving ansible share its state, they run one at a time
+            with self.task_lock(task, task_args):
+                # create object from task class
+                task = task_cls(
+                    self.userdir,
+                    resources,
+                    credentials,
+                    self.verbose,
+                    args=task_args
+                )
 
-            # run task
-            exit_code = task.run()
+                # run task
+                return pos, task.run()
+        except (Exception, SystemExit) as ex:
+            return pos, ex
 
-            # quit group execution if exit code is not zero
-            if exit_code != 0:
-                self.exit_code = exit_code
-                break
+    def run(self):
+        """The main method for group. This method will run the paws tasks
+        from the task list, each one once the tasks it needs are done.
+        Independent tasks run concurrently, up to max parallel tasks."""
+        from multiprocessing.pool import ThreadPool
 
-            if 'args' in item:
-                # delete task arguments values from memory
-                self.del_task_attr(self.map_task_args(args))
+        # pre run tasks
+        self.pre_run()
+
+        self.logger.info("START: %s", self.name)
+
+        # save the start time
+        self.start()
+
+        max_parallel = int(getattr(self.args, 'max_parallel',
+                                   DEFAULT_MAX_WORKERS))
+        completed = dict(self.checkpoint['tasks'])
+        pending = set(range(len(self.tasklist)))
+        running, done, skipped = set(), set(), set()
+        digests = dict()
+        error = None
+        finished = Queue()
+
+        pool = ThreadPool(max(1, min(max_parallel, len(self.tasklist))))
+        try:
+            while pending or running:
+                # start the tasks whose needs are done, until one fails
+                ready = not self.exit_code and error is None
+                while ready:
+                    ready = False
+                    for pos in sorted(pending):
+                        if not self.needs[pos] <= done:
+                            continue
+                        pending.remove(pos)
+                        digests[pos] = self.task_digest(pos)
+
+                        # skip tasks completed with the same inputs, as long
+                        # as the tasks they need were skipped too
+                        key = self.keys[pos]
+                        if completed.get(key) == digests[pos] and \
+                                self.needs[pos] <= skipped:
+                            self.logger.info("Skipping: %s (completed)" %
+                                             self.tasklist[pos]['name'])
+                            done.add(pos)
+                            skipped.add(pos)
+                            ready = True
+                            continue
+
+                        self.checkpoint['tasks'].pop(key, None)
+                        running.add(pos)
+                        pool.apply_async(self.run_task, (pos,),
+                                         callback=finished.put)
+
+                if not running:
+                    break
+
+                pos, result = finished.get()
+                running.remove(pos)
+
+                if isinstance(result, BaseException):
+                    error = error or result
+                elif result != 0:
+                    # quit group execution if exit code is not zero
+                    self.exit_code = self.exit_code or result
+                else:
+                    done.add(pos)
+
+                    # record the completed task
+                    self.checkpoint['tasks'][self.keys[pos]] = digests[pos]
+                    self.save_checkpoint()
+        finally:
+            pool.close()
+            pool.join()
+
+        for pos in sorted(pending):
+            self.logger.warning("Skipped: %s" % self.tasklist[pos]['name'])
 
         # save end time
         self.end()
@@ -310,4 +548,7 @@ in %s %s. Expected .yaml or .yml" % (_rule, krnd, key))
         self.logger.info("END: Group, TIME: %dh:%dm:%ds",
                          self.hours, self.minutes, self.seconds)
 
+        if error is not None:
+            raise error
+
         return self.exit_code
@@ -29,11 +29,11 @@ from ansible.errors import AnsibleRuntimeError
 from os.path import join, exists, isfile
 
 from paws.compat import string_types
-from paws.constants import WIN_EXEC_YAML
 from paws.core import PawsTask, Namespace
 from paws.exceptions import SSHError
-from paws.helpers import cleanup, get_ssh_conn, file_mgmt
+from paws.helpers import wait_for_ssh
 from paws.lib.remote import PlaybookCall, GenModuleResults, create_inventory
+from paws.lib.state import read_resources_paws
 from paws.lib.windows import create_ps_exec_playbook
 
 
@@ -99,7 +99,7 @@ class Winsetup(PawsTask):
             self.args = Namespace(kwargs)
 
         self.playbook = PlaybookCall(self.userdir)
-        self.winsetup_yaml = join(self.userdir, WIN_EXEC_YAML)
+        self.winsetup_yaml = None
         self.pshell = join(self.userdir, self.args.powershell)
 
         try:
@@ -109,14 +109,12 @@ class Winsetup(PawsTask):
 
     def pre_run(self):
         """Perform any necessary pre task actions."""
-        # Clean files generated by paws
-        cleanup([self.winsetup_yaml, self.playbook.inventory_file])
-
         # Use paws generated topology file?
-        if exists(self.resources_paws_file):
-            self.resources = file_mgmt('r', self.resources_paws_file)
+        resources_paws = read_resources_paws(self.resources_paws_file)
+        if resources_paws:
+            self.resources = resources_paws
 
-        # Create inventory file
+        # Create inventory file, reused when the resources did not change
         create_inventory(self.playbook.inventory_file, self.resources)
 
         # Verify PowerShell script exists
@@ -166,55 +164,57 @@ class Winsetup(PawsTask):
         # Get systems
         self.get_systems()
 
-        # Run PowerShell script against supplied machines
+        # Wait for all supplied machines to accept SSH connections at once
+        systems = list()
         for res in self.resources:
-            pb_vars = {}
+            systems.append(dict(host=res.get('public_v4', res.get('ip')),
+                                username=res['win_username'],
+                                password=res['win_password']))
+
+        self.logger.info(
+            "Attempting to establish SSH connection to %s",
+            ", ".join(system['host'] for system in systems)
+        )
+        ready = wait_for_ssh(systems)
+
+        # Initialize playbook variables, shared by all machines
+        pb_vars = {}
+        pb_vars["ps"] = self.pshell
 
+        try:
+            _psvfile = join(self.userdir, self.psv)
+            if isfile(_psvfile):
+                # PowerShell vars is a file
+                pb_vars["psv"] = _psvfile
+                pvars = "file"
+            elif isinstance(self.psv, string_types):
+                # PowerShell vars is a string
+                pvars = "str"
+                pb_vars["psv"] = self.psv
+            else:
+                # PowerShell is neither file or unicode
+                pvars = None
+        except (AttributeError, TypeError):
+            # No PowerShell vars defined, use default
+            pvars = self.psv
+
+        # Create playbook to run PowerShell script on Windows resources
+        self.winsetup_yaml = create_ps_exec_playbook(self.userdir, pvars)
+
+        # Run PowerShell script against supplied machines
+        for res in self.resources:
             # Get resource IP
             try:
                 sut_ip = res['public_v4']
             except KeyError:
                 sut_ip = res['ip']
 
-            # Get resource authentication
-            sut_ssh_user = res['win_username']
-            sut_ssh_password = res['win_password']
-
-            # Initialize playbook variables
             pb_vars["hosts"] = sut_ip
-            pb_vars["ps"] = self.pshell
-
-            try:
-                _psvfile = join(self.userdir, self.psv)
-                if isfile(_psvfile):
-                    # PowerShell vars is a file
-                    pb_vars["psv"] = _psvfile
-                    pvars = "file"
-                elif isinstance(self.psv, string_types):
-                    # PowerShell vars is a string
-                    pvars = "str"
-                    pb_vars["psv"] = self.psv
-                else:
-                    # PowerShell is neither file or unicode
-                    pvars = None
-            except (AttributeError, TypeError):
-                # No PowerShell vars defined, use default
-                pvars = self.psv
-
-            # Create playbook to run PowerShell script on Windows resources
-            self.winsetup_yaml = create_ps_exec_playbook(self.userdir, pvars)
 
             # Test if remote machine is ready for SSH connection
             try:
-                self.logger.info(
-                    "Attempting to establish SSH connection to %s", sut_ip
-                )
-
-                get_ssh_conn(
-                    sut_ip,
-                    sut_ssh_user,
-                    sut_ssh_password
-                )
+                if not ready[sut_ip]:
+                    raise SSHError('Port 22 is unreachable.')
 
                 # Playbook call - run PowerShell script on Windows resources
                 self.playbook.run(
@@ -232,17 +232,13 @@ class Winsetup(PawsTask):
             except (AnsibleRuntimeError, SystemExit):
                 # set exit code
                 self.exit_code = 1
-            finally:
-                # save end time
-                self.end()
 
-                # clean up run time files
-                if not self.verbose:
-                    cleanup([self.winsetup_yaml], self.userdir)
+        # save end time
+        self.end()
 
-                self.logger.info(
-                    "END: %s, TIME: %dh:%dm:%ds", self.name, self.hours,
-                    self.minutes, self.seconds
-                )
+        self.logger.info(
+            "END: %s, TIME: %dh:%dm:%ds", self.name, self.hours,
+            self.minutes, self.seconds
+        )
 
         return self.exit_code
@@ -77,5 +77,11 @@ setup(
     extras_require={
         'libvirt': ['libvirt-python']
     },
-    entry_points={'console_scripts': ['paws=paws.cli:paws']}
+    entry_points={
+        'console_scripts': ['paws=paws.cli:paws'],
+        'paws.providers': [
+            'openstack=paws.providers.openstack:OpenStack',
+            'libvirt_kvm=paws.providers.libvirt_kvm:Libvirt'
+        ]
+    }
 )
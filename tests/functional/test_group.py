@@ -0,0 +1,185 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws group tasks scheduling.
+
+Description:
+
+This pytest module checks how group tasks are ordered and run.
+    1. Tasks without needs run in order, needs are resolved by task name.
+    2. Undefined needs and needs forming a cycle are rejected.
+    3. Independent tasks run concurrently, a task starts once the tasks it
+       needs succeeded and no task starts after a failure.
+    4. Provider actions run alone, tasks driving ansible hold the ansible
+       lock and other tasks run concurrently.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_group.py -v
+"""
+
+from threading import Event, Lock, Thread
+from time import sleep, time
+
+import pytest
+
+from paws.core import Namespace
+from paws.helpers import ANSIBLE_LOCK
+from paws.tasks.group import Group
+
+# seconds each scheduled task takes
+DURATION = 0.2
+
+
+def group(tasks, tmpdir):
+    """Create a group ready to run the tasks given.
+
+    :param tasks: group tasks
+    :type tasks: list
+    :param tmpdir: user directory
+    :return: group
+    :rtype: Group
+    """
+    content = dict(group=[dict(header=dict()), dict(vars=dict()),
+                          dict(tasks=tasks)])
+    obj = Group(str(tmpdir), content,
+                args=Namespace(dict(name='group.yaml', max_parallel=10)))
+    obj.tasklist = tasks
+    obj.needs = obj.dependencies()
+    obj.keys = [item['name'] for item in tasks]
+    obj.checkpoint = dict(group='group.yaml', tasks=dict())
+    obj.pre_run = lambda: None
+    return obj
+
+
+def schedule(obj, failing=()):
+    """Run a group, recording when each task starts and ends.
+
+    :param obj: group
+    :type obj: Group
+    :param failing: names of the tasks exiting with an error right away
+    :type failing: tuple
+    :return: start and end time of each task run, by task name
+    :rtype: dict
+    """
+    times = dict()
+    lock = Lock()
+
+    def run_task(pos):
+        name = obj.tasklist[pos]['name']
+        start = time()
+        if name not in failing:
+            sleep(DURATION)
+        with lock:
+            times[name] = (start, time())
+        return pos, int(name in failing)
+
+    obj.run_task = run_task
+    obj.run()
+    return times
+
+
+def entered(task, task_args):
+    """Check whether a task can start while the current task runs.
+
+    :param task: task name
+    :type task: str
+    :param task_args: task arguments
+    :type task_args: Namespace
+    :return: whether the task got its locks within DURATION
+    :rtype: bool
+    """
+    started, done = Event(), Event()
+
+    def run():
+        with Group.task_lock(task, task_args):
+            started.set()
+            done.wait()
+
+    thread = Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    result = started.wait(DURATION)
+    done.set()
+    return result
+
+
+class TestGroup(object):
+
+    @staticmethod
+    def test_dependencies(tmpdir):
+        obj = group([dict(name='a'), dict(name='b'),
+                     dict(name='c', needs=[]),
+                     dict(name='d', needs=['a', 'c']),
+                     dict(name='e', needs='d')], tmpdir)
+        assert obj.needs == [set(), set([0]), set(), set([0, 2]), set([3])]
+
+    @staticmethod
+    def test_undefined_need(tmpdir):
+        with pytest.raises(SystemExit):
+            group([dict(name='a'), dict(name='b', needs=['c'])], tmpdir)
+
+    @staticmethod
+    def test_cycle(tmpdir):
+        with pytest.raises(SystemExit):
+            group([dict(name='a', needs=['c']), dict(name='b', needs=['a']),
+                   dict(name='c', needs=['b']), dict(name='d')], tmpdir)
+
+    @staticmethod
+    def test_schedule(tmpdir):
+        times = schedule(group([dict(name='a'),
+                                dict(name='b', needs=[]),
+                                dict(name='c', needs=['a', 'b'])], tmpdir))
+
+        # a and b run at the same time, c once both are done
+        assert times['b'][0] < times['a'][1]
+        assert times['c'][0] >= max(times['a'][1], times['b'][1])
+
+    @staticmethod
+    def test_failure(tmpdir):
+        obj = group([dict(name='a'), dict(name='b', needs=[]),
+                     dict(name='c', needs=['a']),
+                     dict(name='d', needs=['b'])], tmpdir)
+        times = schedule(obj, failing=('a',))
+
+        assert obj.exit_code == 1
+        assert 'c' not in times
+        assert 'd' not in times
+
+    @staticmethod
+    def test_task_lock():
+        ansible = Namespace(dict(backend='ansible'))
+        winrm = Namespace(dict(backend='winrm'))
+
+        # configure tasks running over winrm run concurrently
+        with Group.task_lock('configure', winrm):
+            assert entered('configure', winrm)
+            assert not entered('provision', ansible)
+
+        # provider actions run alone
+        with Group.task_lock('teardown', ansible):
+            assert not entered('configure', winrm)
+            assert not entered('show', ansible)
+
+        # tasks driving ansible hold the ansible lock
+        with Group.task_lock('winsetup', ansible):
+            assert not entered('configure', ansible)
+            assert entered('configure', winrm)
@@ -0,0 +1,104 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws inventory generation time.
+
+Description:
+
+This pytest module measures the time to generate the ansible inventory file
+for large topologies.
+    1. The inventory holds one host and one vars section per resource.
+    2. Generating the inventory for 1k and 10k hosts stays under the budget.
+    3. An inventory is only rewritten when the resources change.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_inventory.py -v -s
+"""
+
+from time import time
+
+import os
+import pytest
+
+from paws.lib.inventory import create_inventory, inventory_reuse
+
+# seconds allowed per 1k hosts, generation time grows linearly
+BUDGET_PER_1K_HOSTS = 1.0
+
+
+def resources(count):
+    """Build windows resources.
+
+    :param count: number of resources
+    :type count: int
+    :return: resources
+    :rtype: dict
+    """
+    return dict(resources=[
+        dict(name='win%05d' % index,
+             public_v4='10.%d.%d.%d' % (index >> 16, index >> 8 & 255,
+                                        index & 255),
+             win_username='Administrator',
+             win_password='password')
+        for index in range(count)])
+
+
+class TestInventory(object):
+
+    @staticmethod
+    @pytest.mark.parametrize('count', [1000, 10000])
+    def test_create_inventory(tmpdir, count):
+        filename = str(tmpdir.join('hosts'))
+
+        start = time()
+        create_inventory(filename, resources(count))
+        elapsed = time() - start
+        print('\n%d hosts: %.3f s' % (count, elapsed))
+
+        with open(filename) as f:
+            data = f.read()
+        assert data.count('\n[win') == count * 2
+        assert ' = None' not in data
+        assert '[win%05d]\n10.0.0.0\n' % 0 in data
+        assert elapsed < BUDGET_PER_1K_HOSTS * count / 1000
+        assert tmpdir.listdir() == [tmpdir.join('hosts')]
+
+    @staticmethod
+    def test_reuse_inventory(tmpdir):
+        filename = str(tmpdir.join('hosts'))
+        res = resources(10)
+
+        create_inventory(filename, res)
+        inode = os.stat(filename).st_ino
+        assert inventory_reuse(filename, res)
+
+        # unchanged resources never rewrite the inventory
+        create_inventory(filename, res)
+        assert os.stat(filename).st_ino == inode
+
+        # a host name prefix of another one is not a match
+        res['resources'][1]['name'] = 'win0000'
+        assert not inventory_reuse(filename, res)
+
+        create_inventory(filename, res)
+        assert os.stat(filename).st_ino != inode
+        assert inventory_reuse(filename, res)
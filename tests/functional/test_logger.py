@@ -0,0 +1,70 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws logger overhead.
+
+Description:
+
+This pytest module measures the overhead paws adds to each log call made
+through the LoggerMixin logger property.
+    1. The logger is resolved once per class and named after its module.
+    2. The per log call overhead stays under the budget.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_logger.py -v -s
+"""
+
+from logging import getLogger
+from timeit import timeit
+
+from paws.core import LoggerMixin
+
+# log calls made by the benchmark
+CALLS = 10000
+
+# seconds allowed per log call (disabled level), well below frame inspection
+CALL_BUDGET = 0.00005
+
+
+class Provider(LoggerMixin):
+
+    def poll(self):
+        self.logger.debug('polling')
+
+
+class TestLogger(object):
+
+    @staticmethod
+    def test_logger_name():
+        provider = Provider()
+        assert provider.logger is getLogger(__name__)
+        assert provider.logger is Provider().logger
+
+    @staticmethod
+    def test_log_call_overhead():
+        getLogger(__name__).disabled = True
+        try:
+            elapsed = timeit(Provider().poll, number=CALLS)
+        finally:
+            getLogger(__name__).disabled = False
+        print('\nper log call: %.2f us' % (elapsed / CALLS * 1e6))
+        assert elapsed / CALLS < CALL_BUDGET
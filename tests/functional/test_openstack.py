@@ -0,0 +1,395 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws OpenStack provider caching and concurrency.
+
+Description:
+
+This pytest module runs the OpenStack provider against a fake libcloud
+driver, no cloud is needed.
+    1. Vms building share the node state polls.
+    2. Catalog listings are saved and reused until their ttl expires.
+    3. Reserved floating ips are kept up to the reservations size and never
+       handed out twice, even to concurrent paws processes.
+    4. Pooled vms are only claimed once every resource is valid and go back
+       to the pool when they cannot be claimed.
+    5. Pooled and booted vms are provisioned together and torn down
+       together.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_openstack.py -v
+"""
+
+from multiprocessing import Pool
+from threading import Lock, Thread
+
+import pytest
+from os.path import join
+
+from paws.constants import OPENSTACK_CATALOG, OPENSTACK_FLOATING_IPS, \
+    OPENSTACK_POOL
+from paws.exceptions import ProvisionError
+from paws.helpers import file_mgmt
+from paws.providers.openstack import Catalog, FloatingIpReservations, \
+    NodeStatePoller, OpenStack, WarmPool
+
+
+class FakeObject(object):
+    """Libcloud catalog object."""
+
+    def __init__(self, name, id=None):
+        self.name = name
+        self.id = id or name
+
+
+class FakeNode(object):
+    """Libcloud node."""
+
+    def __init__(self, name, state='running', public_v4=None):
+        self.name = name
+        self.id = 'id-%s' % name
+        self.state = state
+        self.extra = dict(addresses=dict(private=list()))
+        if public_v4 is not None:
+            self.attach(public_v4)
+
+    def attach(self, ip_address):
+        self.extra['addresses']['private'].append(
+            {'addr': ip_address, 'OS-EXT-IPS:type': 'floating'})
+
+
+class FakeFloatingIp(object):
+    """Libcloud floating ip."""
+
+    def __init__(self, ip_address):
+        self.id = 'fip-%s' % ip_address
+        self.ip_address = ip_address
+
+
+class FakePool(FakeObject):
+    """Libcloud floating ip pool."""
+
+    def __init__(self, name):
+        super(FakePool, self).__init__(name)
+        self.created = list()
+
+    def create_floating_ip(self):
+        fip = FakeFloatingIp('10.1.0.%d' % (len(self.created) + 1))
+        self.created.append(fip)
+        return fip
+
+
+class FakeDriver(object):
+    """Libcloud OpenStack driver keeping its vms in memory."""
+
+    def __init__(self):
+        self.nodes = list()
+        self.lock = Lock()
+        self.calls = dict()
+        self.fail_update = False
+        self.pool = FakePool('public')
+
+    def called(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def list_nodes(self):
+        self.called('list_nodes')
+        return list(self.nodes)
+
+    def list_images(self):
+        self.called('list_images')
+        return [FakeObject('win-2012-r2')]
+
+    def list_sizes(self):
+        return [FakeObject('m1.large')]
+
+    def list_key_pairs(self):
+        return [FakeObject('paws')]
+
+    def ex_list_networks(self):
+        return [FakeObject('private')]
+
+    def ex_list_floating_ip_pools(self):
+        return [self.pool]
+
+    def ex_list_floating_ips(self):
+        return list()
+
+    def create_node(self, name, **kwargs):
+        self.called('create_node')
+        node = FakeNode(name)
+        with self.lock:
+            self.nodes.append(node)
+        return node
+
+    def ex_update_node(self, node, name):
+        self.called('ex_update_node')
+        if self.fail_update:
+            raise RuntimeError('update failed')
+        node.name = name
+
+    def ex_attach_floating_ip_to_node(self, node, fip):
+        node.attach(fip.ip_address)
+        return True
+
+    def ex_get_floating_ip(self, ip_address):
+        return FakeFloatingIp(ip_address)
+
+    def ex_detach_floating_ip_from_node(self, node, fip):
+        return True
+
+    def ex_delete_floating_ip(self, fip):
+        self.called('ex_delete_floating_ip')
+        return True
+
+    def destroy_node(self, node):
+        self.called('destroy_node')
+        with self.lock:
+            self.nodes.remove(node)
+        return True
+
+
+def resource(name, image='win-2012-r2', **kwargs):
+    """Build a windows resource.
+
+    :param name: vm name
+    :type name: str
+    :param image: image name
+    :type image: str
+    :return: windows resource
+    :rtype: dict
+    """
+    res = dict(name=name, provider='openstack', image=image,
+               flavor='m1.large', network='public', keypair='paws')
+    res.update(kwargs)
+    return res
+
+
+def provider(tmpdir, resources, driver=None):
+    """Create an OpenStack provider using a fake driver.
+
+    :param tmpdir: user directory
+    :param resources: windows resources
+    :type resources: list
+    :param driver: fake driver
+    :type driver: FakeDriver
+    :return: OpenStack provider
+    :rtype: OpenStack
+    """
+    user_dir = str(tmpdir)
+    obj = object.__new__(OpenStack)
+    obj._credentials = dict(max_workers=4)
+    obj.user_dir = user_dir
+    obj.resources_paws_file = join(user_dir, 'resources.paws')
+    obj.verbose = 0
+    obj.resources = resources
+    obj.driver = driver or FakeDriver()
+    obj.poller = NodeStatePoller(obj.driver, min_delay=0.01, max_delay=0.05)
+    obj.catalog = Catalog(obj.driver, join(user_dir, OPENSTACK_CATALOG))
+    obj.reservations = FloatingIpReservations(
+        join(user_dir, OPENSTACK_FLOATING_IPS), size=2)
+    obj.warm_pool = WarmPool(join(user_dir, OPENSTACK_POOL))
+    return obj
+
+
+def pooled_vm(obj, name, res):
+    """Add a ready vm to the warm pool, booted for a resource.
+
+    :param obj: OpenStack provider
+    :type obj: OpenStack
+    :param name: pooled vm name
+    :type name: str
+    :param res: resource the vm was booted for
+    :type res: dict
+    """
+    obj.driver.nodes.append(FakeNode(name, public_v4='10.2.0.1'))
+    obj.warm_pool.add(dict(name=name, public_v4='10.2.0.1',
+                           win_username='Administrator',
+                           win_password='Passw0rd'), obj.warm_pool.spec(res))
+
+
+def take(filename):
+    """Take every reserved floating ip, from another process.
+
+    :param filename: reservations file
+    :type filename: str
+    :return: floating ips ids taken
+    :rtype: list
+    """
+    reservations = FloatingIpReservations(filename, size=100)
+    taken = list()
+    while True:
+        fip = reservations.take('public')
+        if fip is None:
+            return taken
+        taken.append(fip.id)
+
+
+class TestOpenStack(object):
+
+    @staticmethod
+    def test_poller():
+        driver = FakeDriver()
+        nodes = [FakeNode('vm%d' % index, state='build')
+                 for index in range(10)]
+        driver.nodes = nodes
+
+        # vms are running after the third listing
+        list_nodes = driver.list_nodes
+
+        def running():
+            if driver.calls.get('list_nodes', 0) == 2:
+                for node in nodes:
+                    node.state = 'running'
+            return list_nodes()
+        driver.list_nodes = running
+
+        poller = NodeStatePoller(driver, min_delay=0.01, max_delay=0.05)
+        results = list()
+        threads = [Thread(target=lambda node=node: results.append(
+            poller.wait(node, 5))) for node in nodes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 10
+        assert driver.calls['list_nodes'] == 3
+
+    @staticmethod
+    def test_catalog_ttl(tmpdir):
+        driver = FakeDriver()
+        filename = join(str(tmpdir), OPENSTACK_CATALOG)
+
+        assert Catalog(driver, filename, ttl=60).get(
+            'images', 'win-2012-r2').name == 'win-2012-r2'
+        image = Catalog(driver, filename, ttl=60).get('images', 'win-2012-r2')
+        assert image.name == 'win-2012-r2'
+        assert driver.calls['list_images'] == 1
+
+        # expired listings are listed again
+        content = file_mgmt('r', filename)
+        content['default']['images']['time'] -= 60
+        file_mgmt('w', filename, content)
+        Catalog(driver, filename, ttl=60).get('images', 'win-2012-r2')
+        assert driver.calls['list_images'] == 2
+
+        # missing objects are looked up again before giving up
+        assert Catalog(driver, filename, ttl=60).get('images', 'win') is None
+        assert driver.calls['list_images'] == 3
+
+    @staticmethod
+    def test_reservations(tmpdir):
+        reservations = FloatingIpReservations(
+            join(str(tmpdir), OPENSTACK_FLOATING_IPS), size=2)
+        fips = [FakeFloatingIp('10.1.0.%d' % index) for index in range(3)]
+
+        assert [reservations.give_back('public', fip) for fip in fips] == \
+            [True, True, False]
+        assert reservations.take('public').id == fips[0].id
+        assert reservations.take('private') is None
+        assert reservations.take('public').id == fips[1].id
+        assert reservations.take('public') is None
+
+    @staticmethod
+    def test_reservations_processes(tmpdir):
+        filename = join(str(tmpdir), OPENSTACK_FLOATING_IPS)
+        reservations = FloatingIpReservations(filename, size=100)
+        for index in range(100):
+            reservations.give_back(
+                'public', FakeFloatingIp('10.1.0.%d' % index))
+
+        pool = Pool(8)
+        try:
+            taken = sum(pool.map(take, [filename] * 8), list())
+        finally:
+            pool.close()
+            pool.join()
+
+        assert len(taken) == 100
+        assert len(set(taken)) == 100
+
+    @staticmethod
+    def test_warm_pool_claim(tmpdir):
+        obj = provider(tmpdir, list())
+        res = resource('win01', pool_size=1)
+        pooled_vm(obj, 'pool-1', res)
+        pooled_vm(obj, 'pool-2', resource('win01', flavor='m1.small'))
+
+        entry = obj.warm_pool.claim(res)
+        assert entry['name'] == 'pool-1'
+        assert obj.warm_pool.claim(res) is None
+        assert [item['name'] for item in obj.warm_pool.entries()] == \
+            ['pool-2']
+
+    @staticmethod
+    def test_warm_pool_rollback(tmpdir):
+        obj = provider(tmpdir, list())
+        res = resource('win01', pool_size=1)
+        pooled_vm(obj, 'pool-1', res)
+        obj.driver.fail_update = True
+
+        assert not obj.claim_pooled_vm(res, obj.get_nodes())
+        assert [item['name'] for item in obj.warm_pool.entries(
+            obj.warm_pool.spec(res))] == ['pool-1']
+        assert 'public_v4' not in res
+
+    @staticmethod
+    def test_provision_invalid_resource(tmpdir):
+        res = resource('win01', pool_size=1)
+        obj = provider(tmpdir, [res, resource('win02', image='missing')])
+        pooled_vm(obj, 'pool-1', res)
+
+        with pytest.raises(ProvisionError):
+            obj.provision()
+
+        # nothing was claimed from the pool nor booted
+        assert len(obj.warm_pool.entries()) == 1
+        assert 'ex_update_node' not in obj.driver.calls
+        assert 'create_node' not in obj.driver.calls
+
+    @staticmethod
+    def test_provision_teardown(tmpdir):
+        pooled = resource('win01', pool_size=1)
+        obj = provider(tmpdir, [pooled, resource('win02'),
+                                resource('win03')])
+        pooled_vm(obj, 'pool-1', pooled)
+        obj.reservations.give_back('public', FakeFloatingIp('10.3.0.1'))
+
+        resources_paws = obj.provision()
+
+        addresses = dict((res['name'], res['public_v4'])
+                         for res in resources_paws['resources'])
+        assert sorted(addresses) == ['win01', 'win02', 'win03']
+        assert addresses['win01'] == '10.2.0.1'
+        assert '10.3.0.1' in addresses.values()
+        assert obj.driver.calls['create_node'] == 2
+        assert sorted(node.name for node in obj.driver.nodes) == \
+            ['win01', 'win02', 'win03']
+
+        obj.teardown()
+
+        # two floating ips are reserved again, the third one is deleted
+        assert obj.driver.nodes == list()
+        assert obj.driver.calls['ex_delete_floating_ip'] == 1
+        assert obj.reservations.take('public') is not None
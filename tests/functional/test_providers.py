@@ -0,0 +1,103 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws provider resources partitioning.
+
+Description:
+
+This pytest module checks how resources and credentials are partitioned by
+provider on topologies with thousands of resources.
+    1. Resources are partitioned by exact provider name, aliases included.
+    2. Partitioning thousands of resources stays under the time budget.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_providers.py -v -s
+"""
+
+from time import time
+
+import pytest
+
+from paws.exceptions import NotFound
+from paws.providers import Provider
+
+# seconds allowed to partition the resources and look them up per provider
+BUDGET = 1.0
+
+CREDENTIALS = dict(credentials=[
+    dict(provider='openstack', os_username='user'),
+    dict(provider='libvirt', qemu_instance='qemu:///system'),
+    dict(provider='openstack', os_username='ignored')
+])
+
+
+def topology(count):
+    """Build a topology mixing providers.
+
+    :param count: number of resources
+    :type count: int
+    :return: resources
+    :rtype: dict
+    """
+    providers = ['openstack', 'libvirt', 'libvirt_kvm']
+    return dict(resources=[
+        dict(name='win%05d' % index, provider=providers[index % 3])
+        for index in range(count)])
+
+
+class TestProviders(object):
+
+    @staticmethod
+    @pytest.mark.parametrize('count', [3000, 30000])
+    def test_partition(count):
+        start = time()
+        provider = Provider('/tmp', topology(count), CREDENTIALS,
+                            '/tmp/resources.paws', 0)
+        openstack = provider.get_resources_by_provider('openstack')
+        libvirt = provider.get_resources_by_provider('libvirt')
+        elapsed = time() - start
+        print('\n%d resources: %.3f s' % (count, elapsed))
+
+        assert provider.get_provider() == set(['openstack', 'libvirt_kvm'])
+        assert len(openstack) == count // 3
+        assert len(libvirt) == count - count // 3
+        assert all(res['provider'] == 'openstack' for res in openstack)
+        assert elapsed < BUDGET
+
+    @staticmethod
+    def test_credentials():
+        provider = Provider('/tmp', topology(3), CREDENTIALS,
+                            '/tmp/resources.paws', 0)
+        assert provider.get_creds_by_provider('openstack')[
+            'os_username'] == 'user'
+        assert provider.get_creds_by_provider('libvirt_kvm') is \
+            provider.get_creds_by_provider('libvirt')
+
+    @staticmethod
+    def test_registry():
+        assert Provider.get_provider_name('libvirt') == 'libvirt_kvm'
+        assert Provider.get_provider_info_by_name('open') is None
+        provider = Provider('/tmp', topology(1), None,
+                            '/tmp/resources.paws', 0)
+        assert provider.get_creds_by_provider('openstack') is None
+        with pytest.raises(NotFound):
+            provider.get_provider_class('open')
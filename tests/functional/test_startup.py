@@ -0,0 +1,89 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws startup time.
+
+Description:
+
+This pytest module checks that paws commands only import the heavy
+dependencies needed by the task being run.
+    1. paws --help imports none of them and stays under the time budget.
+    2. paws show (OpenStack) does not import ansible, paramiko or libvirt and
+    stays under the time budget.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_startup.py -v
+"""
+
+import subprocess
+import sys
+from time import time
+
+import pytest
+
+# seconds allowed to start a paws command, including interpreter startup
+STARTUP_BUDGET = 2.0
+
+# dependencies only needed by some tasks or providers
+HEAVY_MODULES = ['ansible', 'paramiko', 'libvirt', 'libcloud', 'winrm']
+
+# print the top level modules imported once the code given has run
+CODE = """
+import sys
+try:
+    %s
+except SystemExit:
+    pass
+sys.stdout.write(','.join(set(name.split('.')[0] for name in sys.modules)))
+"""
+
+
+def run_python(code):
+    """Run python code in a new interpreter.
+
+    :param code: python code to run
+    :return: elapsed time and top level modules imported
+    :rtype: tuple
+    """
+    start = time()
+    output = subprocess.check_output([sys.executable, '-c', CODE % code])
+    elapsed = time() - start
+    return elapsed, output.decode('utf-8').strip().split(',')
+
+
+class TestStartup(object):
+
+    @staticmethod
+    def test_help():
+        elapsed, modules = run_python(
+            "from paws.cli import paws; paws(['--help'])")
+        assert not [name for name in HEAVY_MODULES if name in modules]
+        assert elapsed < STARTUP_BUDGET
+
+    @staticmethod
+    def test_show():
+        pytest.importorskip('libcloud')
+        elapsed, modules = run_python(
+            "import paws.main, paws.tasks.action, paws.providers.openstack")
+        assert not [name for name in ['ansible', 'paramiko', 'libvirt']
+                    if name in modules]
+        assert elapsed < STARTUP_BUDGET
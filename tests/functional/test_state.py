@@ -0,0 +1,126 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Test paws sqlite resources state backend.
+
+Description:
+
+This pytest module checks the SQLite state store used by the sqlite state
+backend.
+    1. Providers replace their own resources, other providers are kept.
+    2. Resources keep their order when updated and are exported to
+       resources.paws.
+    3. Querying one provider resources out of thousands stays under the time
+       budget.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_state.py -v -s
+"""
+
+from time import time
+
+from os.path import exists, join
+
+from paws.constants import STATE_BACKEND_ENV
+from paws.lib.state import StateStore, read_resources_paws, \
+    write_resources_paws
+
+# seconds allowed to query the resources of a provider
+BUDGET = 0.5
+
+
+def resources(provider, count, start=0):
+    """Build resources of a provider.
+
+    :param provider: provider name
+    :type provider: str
+    :param count: number of resources
+    :type count: int
+    :param start: first resource index
+    :type start: int
+    :return: resources
+    :rtype: list
+    """
+    return [dict(name='%s%05d' % (provider, index), provider=provider,
+                 public_v4='10.0.0.%d' % (index % 255))
+            for index in range(start, start + count)]
+
+
+class TestState(object):
+
+    @staticmethod
+    def test_replace(tmpdir):
+        store = StateStore.get(str(tmpdir))
+        store.upsert('openstack', resources('openstack', 3))
+        store.upsert('libvirt_kvm', resources('libvirt', 2))
+
+        updated = resources('openstack', 2, start=1)
+        updated[0]['public_v4'] = '10.0.1.1'
+        store.replace('openstack', updated)
+
+        names = [res['name'] for res in store.query()]
+        assert names == ['openstack00001', 'openstack00002', 'libvirt00000',
+                         'libvirt00001']
+        assert store.query(names=['openstack00001'])[0]['public_v4'] == \
+            '10.0.1.1'
+
+        store.delete(['libvirt00000'])
+        assert len(store.query('libvirt_kvm')) == 1
+
+        resources_paws_file = join(str(tmpdir), 'resources.paws')
+        store.export(resources_paws_file)
+        assert exists(resources_paws_file)
+
+        store.replace('openstack', list())
+        store.replace('libvirt_kvm', list())
+        store.export(resources_paws_file)
+        assert not exists(resources_paws_file)
+
+    @staticmethod
+    def test_backend(tmpdir, monkeypatch):
+        monkeypatch.setenv(STATE_BACKEND_ENV, 'sqlite')
+        resources_paws_file = join(str(tmpdir), 'resources.paws')
+
+        write_resources_paws(resources_paws_file, dict(
+            resources=resources('openstack', 2) + resources('libvirt', 1)),
+            'openstack')
+        write_resources_paws(resources_paws_file, dict(
+            resources=resources('libvirt', 2)), 'libvirt')
+
+        assert not exists(resources_paws_file)
+        assert len(read_resources_paws(resources_paws_file)['resources']) == 4
+        assert len(read_resources_paws(
+            resources_paws_file, 'libvirt_kvm')['resources']) == 2
+
+    @staticmethod
+    def test_query(tmpdir):
+        store = StateStore.get(str(tmpdir))
+        store.upsert('openstack', resources('openstack', 5000))
+        store.upsert('libvirt_kvm', resources('libvirt', 500))
+
+        start = time()
+        found = store.query('libvirt_kvm')
+        elapsed = time() - start
+        print('\n500 of 5500 resources: %.3f s' % elapsed)
+
+        assert len(found) == 500
+        assert elapsed < BUDGET
@@ -0,0 +1,123 @@
+#
+# paws -- provision automated windows and services
+# Copyright (C) 2016 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmark paws yaml files parsing and dumping.
+
+Description:
+
+This pytest module times file_mgmt reading and writing large topology files
+and compares it with the pure python yaml loader and dumper.
+    1. Topologies round trip through file_mgmt unchanged.
+    2. Parsing and dumping stays under the time budget.
+    3. file_mgmt is faster than pure python yaml when libyaml is available.
+
+How to run:
+    1. Install paws and pytest
+        $ pip install -e . pytest
+    2. Run pytest
+        $ pytest tests/functional/test_yaml.py -v -s
+"""
+
+from time import time
+
+import pytest
+import yaml
+from os.path import join
+
+from paws.helpers import file_mgmt
+
+# seconds allowed to dump and parse 1000 resources
+BUDGET_PER_1K_RESOURCES = 1.0
+
+
+def topology(count):
+    """Build a topology with OpenStack resources.
+
+    :param count: number of resources
+    :type count: int
+    :return: resources
+    :rtype: dict
+    """
+    return dict(resources=[
+        dict(name='win%05d' % index,
+             provider='openstack',
+             image='win-2012-r2',
+             flavor='m1.large',
+             network='provider_net_cci_%d' % (index % 8),
+             keypair='paws',
+             floating_ip_pool='10.8.240.0',
+             public_v4='10.8.%d.%d' % (index // 255 % 255, index % 255),
+             win_username='Administrator',
+             win_password='Passw0rd%d' % index,
+             snapshot=dict(name='base', clean=True))
+        for index in range(count)])
+
+
+def timed(function, *args, **kwargs):
+    """Call a function.
+
+    :return: elapsed time and function result
+    :rtype: tuple
+    """
+    start = time()
+    result = function(*args, **kwargs)
+    return time() - start, result
+
+
+class TestYaml(object):
+
+    @staticmethod
+    @pytest.mark.parametrize('count', [1000, 5000])
+    def test_file_mgmt(tmpdir, count):
+        content = topology(count)
+        filename = join(str(tmpdir), 'resources.yaml')
+
+        dump_time, _ = timed(file_mgmt, 'w', filename, content)
+        load_time, loaded = timed(file_mgmt, 'r', filename)
+        print('\n%d resources: dump %.3f s, parse %.3f s' %
+              (count, dump_time, load_time))
+
+        assert loaded == content
+        assert dump_time + load_time < BUDGET_PER_1K_RESOURCES * count / 1000
+
+    @staticmethod
+    @pytest.mark.skipif(not yaml.__with_libyaml__,
+                        reason='libyaml bindings are not available')
+    def test_pure_python(tmpdir):
+        content = topology(1000)
+        filename = join(str(tmpdir), 'resources.yaml')
+
+        def file_mgmt_round_trip():
+            file_mgmt('w', filename, content)
+            return file_mgmt('r', filename)
+
+        file_time = sum(timed(file_mgmt_round_trip)[0] for _ in range(2))
+
+        def round_trip():
+            with open(filename, 'w') as f_raw:
+                yaml.dump(content, f_raw, Dumper=yaml.SafeDumper,
+                          default_flow_style=False)
+            with open(filename) as f_raw:
+                return yaml.load(f_raw, Loader=yaml.SafeLoader)
+
+        pure_time = sum(timed(round_trip)[0] for _ in range(2))
+        print('\nfile_mgmt %.3f s, pure python %.3f s' %
+              (file_time, pure_time))
+
+        assert file_time < pure_time